@@ -0,0 +1,115 @@
+"""
+Benchmark mémoire de la lecture des valeurs des analogues (analog_values_raw).
+
+Un fichier de prévision synthétique (nombreuses stations partageant une même base
+de prédictands) est créé, puis chaque mode de lecture est exécuté dans un
+sous-processus afin de mesurer son pic de mémoire (RSS) :
+
+* baseline : import des modules uniquement (référence),
+* full : lecture de la matrice complète (stations x analogues),
+* subset : lecture des seules stations pertinentes (predictand_station_ids),
+* export_prv : export PRV complet (stations pertinentes uniquement).
+
+Usage : python benchmarks/bench_forecast_memory.py [--stations 3000]
+Nécessite le module resource (Linux ou macOS).
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import atmoswing_vigicrues as asv
+
+
+def create_forecast_file(path, n_stations, n_targets, n_analogs, n_relevant):
+    nc_file = asv.Dataset(path, 'w', format='NETCDF4')
+    nc_file.createDimension('stations', n_stations)
+    nc_file.createDimension('lead_time', n_targets)
+    nc_file.createDimension('analogs_tot', n_targets * n_analogs)
+
+    rng = np.random.default_rng(42)
+    nc_file.createVariable('station_ids', 'i4', ('stations',))[:] = \
+        np.arange(1, n_stations + 1)
+    nc_file.createVariable('target_dates', 'f4', ('lead_time',))[:] = \
+        59930 + np.arange(n_targets)
+    nc_file.createVariable('analogs_nb', 'i4', ('lead_time',))[:] = n_analogs
+    nc_file.createVariable('analog_dates', 'f4', ('analogs_tot',))[:] = \
+        rng.integers(30000, 59000, n_targets * n_analogs)
+    nc_file.createVariable('analog_criteria', 'f4', ('analogs_tot',))[:] = \
+        rng.uniform(0, 100, n_targets * n_analogs)
+    values = nc_file.createVariable('analog_values_raw', 'f4',
+                                    ('stations', 'analogs_tot'))
+    for start in range(0, n_stations, 100):
+        end = min(start + 100, n_stations)
+        values[start:end, :] = rng.gamma(0.5, 10, (end - start, n_targets * n_analogs))
+
+    relevant = rng.choice(np.arange(1, n_stations + 1), n_relevant, replace=False)
+    nc_file.predictand_station_ids = ",".join(str(i) for i in sorted(relevant))
+    nc_file.origin = "Benchmark"
+    nc_file.creation_date = "2023-01-01 00:00:00"
+    nc_file.method_id = "BENCH"
+    nc_file.specific_tag = "bench"
+    nc_file.predictand_dataset_id = "Benchmark"
+    nc_file.close()
+
+
+def run_mode(mode, path):
+    forecast_file = asv.ForecastFile(path)
+    if mode == 'baseline':
+        forecast_file.station_ids
+    elif mode == 'full':
+        forecast_file.analog_values_raw
+    elif mode == 'subset':
+        station_ids = forecast_file.station_ids.tolist()
+        rows = [station_ids.index(i) for i in forecast_file.relevant_station_ids]
+        forecast_file.get_analog_values(rows)
+    elif mode == 'export_prv':
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            export = asv.ExportPrv('Benchmark', {'output_dir': tmp_dir})
+            export.feed([forecast_file], {'forecast_date': "2023-01-01 00:00:00"})
+            export.run()
+    forecast_file.close()
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        max_rss /= 1024
+    print(max_rss / 1024)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Pic de mémoire de la lecture de analog_values_raw.")
+    parser.add_argument('--stations', type=int, default=3000)
+    parser.add_argument('--targets', type=int, default=40)
+    parser.add_argument('--analogs', type=int, default=240)
+    parser.add_argument('--relevant', type=int, default=10)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.child:
+        run_mode(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / '2023-01-01_00.BENCH.bench.nc')
+        create_forecast_file(path, args.stations, args.targets, args.analogs,
+                             args.relevant)
+        size = args.stations * args.targets * args.analogs * 4 / 1024 ** 2
+        print(f"Matrice analog_values_raw : {args.stations} stations x "
+              f"{args.targets * args.analogs} analogues ({size:.0f} Mo), "
+              f"{args.relevant} stations pertinentes")
+
+        for mode in ['baseline', 'full', 'subset', 'export_prv']:
+            ret = subprocess.run([sys.executable, __file__, '--child', mode, path],
+                                 capture_output=True, text=True, check=True)
+            max_rss = float(ret.stdout.strip().splitlines()[-1])
+            print(f"{mode:>11} : pic RSS {max_rss:8.1f} Mo")
+
+
+if __name__ == "__main__":
+    main()
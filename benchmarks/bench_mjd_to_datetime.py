@@ -0,0 +1,37 @@
+"""
+Micro-benchmark de la conversion des dates MJD (utils.mjd_to_datetime).
+
+Affiche le temps de conversion par million de dates pour des tableaux de
+différentes tailles, en float64 et en float32 (type des fichiers AtmoSwing).
+
+Usage : python benchmarks/bench_mjd_to_datetime.py [--repeat 5]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+import atmoswing_vigicrues as asv
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Débit de la conversion utils.mjd_to_datetime.")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Nombre de répétitions (le meilleur temps est retenu).")
+    args = parser.parse_args(args)
+
+    rng = np.random.default_rng(42)
+    for size in [1_000, 100_000, 1_000_000]:
+        for dtype in [np.float64, np.float32]:
+            mjd = rng.uniform(30000, 70000, size).astype(dtype)
+            number = max(1, 100_000 // size)
+            timer = timeit.Timer(lambda: asv.utils.mjd_to_datetime(mjd))
+            best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+            per_million = best * 1_000_000 / size
+            print(f"{size:>9} dates {np.dtype(dtype).name:>7} : "
+                  f"{per_million:8.3f} s / million de dates")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,13 +15,17 @@ except ImportError:
 else:
     has_eccodes = True
 
+from .artifacts import Artifact, ArtifactRegistry
+from .connections import SftpConnection, SftpConnectionPool, sftp_pool
 from .controller import Controller
 from .disseminations.dissemination import Dissemination
+from .disseminations.outbox import Outbox
 from .disseminations.transfer_sftp_out import TransferSftpOut
 from .exceptions import (ConfigError, Error, FilePathError, OptionError,
                          PathError)
 from .options import Options
 from .postactions.postaction import PostAction
+from .postactions.forecast_file import ForecastFile
 from .postactions.export_bdapbp import ExportBdApBp
 from .postactions.export_prv import ExportPrv
 from .preactions.preaction import PreAction
@@ -37,4 +41,5 @@ __all__ = ('Error', 'OptionError', 'ConfigError', 'PathError', 'FilePathError',
            'DownloadGfsData', 'TransformGfsData', 'TransformEcmwfData', 'file_exists',
            'check_file_exists', 'check_dir_exists', 'build_date_dir_structure',
            'Dataset', 'eccodes', 'TransferSftpIn', 'PreAction', 'PostAction',
-           'Dissemination')
+           'Dissemination', 'Outbox', 'SftpConnection', 'SftpConnectionPool',
+           'sftp_pool', 'Artifact', 'ArtifactRegistry', 'ForecastFile')
@@ -17,11 +17,18 @@ def main(args=None) -> int:
     parser.add_argument(
         '-i', '--time-increment', type=int, required=False,
         help="Incrément en heures pour l'émission de la prévision (par défaut 6h).")
+    parser.add_argument(
+        '--drain', action='store_true', required=False,
+        help="Renvoie uniquement les diffusions en attente, sans refaire la "
+             "prévision.")
 
     args = parser.parse_args(args)
 
     controller = Controller(args)
 
+    if args.drain:
+        return controller.drain()
+
     if args.date:
         date = datetime.strptime(args.date, '%Y%m%d%H')
         return controller.run(date)
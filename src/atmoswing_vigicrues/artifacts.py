@@ -0,0 +1,104 @@
+import os
+import threading
+from pathlib import Path
+
+
+class Artifact:
+    """
+    Fichier produit lors d'une exécution du flux de la prévision.
+
+    Parameters
+    ----------
+    path : str
+        Chemin du fichier.
+    tag : str
+        Étiquette du fichier (p. ex. le nom de l'action l'ayant produit).
+
+    Attributes
+    ----------
+    path : str
+        Chemin du fichier.
+    size : int
+        Taille du fichier en octets.
+    type : str
+        Type du fichier (son extension, p. ex. '.json').
+    tag : str
+        Étiquette du fichier.
+    """
+
+    def __init__(self, path, tag=None):
+        self.path = str(path)
+        self.size = os.path.getsize(self.path)
+        self.type = Path(self.path).suffix
+        self.tag = tag
+
+
+class ArtifactRegistry:
+    """
+    Registre des fichiers produits par les post-actions lors d'une exécution, mis à
+    disposition des disséminations sans parcourir à nouveau les répertoires.
+
+    Attributes
+    ----------
+    artifacts : list
+        Les fichiers enregistrés (instances de Artifact), dans l'ordre de leur
+        production.
+    """
+
+    def __init__(self):
+        self.artifacts = []
+        self._lock = threading.Lock()
+
+    def register(self, path, tag=None):
+        """
+        Enregistrement d'un fichier produit.
+
+        Parameters
+        ----------
+        path : str|Path
+            Chemin du fichier.
+        tag : str
+            Étiquette du fichier (p. ex. le nom de l'action l'ayant produit).
+        """
+        artifact = Artifact(path, tag)
+        with self._lock:
+            self.artifacts = [a for a in self.artifacts if a.path != artifact.path]
+            self.artifacts.append(artifact)
+
+    def select(self, extension=None, tag=None, directory=None) -> list:
+        """
+        Sélection des fichiers produits selon leur extension, leur étiquette et/ou
+        leur répertoire.
+
+        Parameters
+        ----------
+        extension : str
+            Extension des fichiers (p. ex. '.json').
+        tag : str
+            Étiquette des fichiers.
+        directory : str|Path
+            Répertoire contenant les fichiers (sous-répertoires compris).
+
+        Returns
+        -------
+        list
+            Les chemins des fichiers correspondants.
+        """
+        with self._lock:
+            artifacts = list(self.artifacts)
+        if extension:
+            artifacts = [a for a in artifacts if a.path.endswith(extension)]
+        if tag:
+            artifacts = [a for a in artifacts if a.tag == tag]
+        if directory:
+            directory = os.path.abspath(directory)
+            artifacts = [a for a in artifacts if os.path.commonpath(
+                [directory, os.path.abspath(a.path)]) == directory]
+        return [a.path for a in artifacts]
+
+    def clear(self):
+        """
+        Suppression de tous les fichiers enregistrés.
+        """
+        with self._lock:
+            self.artifacts = []
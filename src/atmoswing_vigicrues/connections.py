@@ -0,0 +1,301 @@
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+
+class SftpConnection:
+    """
+    Connexion SFTP authentifiée, pouvant être réutilisée par plusieurs actions.
+
+    Parameters
+    ----------
+    key : tuple
+        La clé de la connexion (hôte, port, utilisateur, proxy).
+    transport : paramiko.Transport
+        Le transport SSH authentifié.
+    sftp : paramiko.SFTPClient
+        Le client SFTP ouvert sur le transport.
+
+    Attributes
+    ----------
+    key : tuple
+        La clé de la connexion (hôte, port, utilisateur, proxy).
+    transport : paramiko.Transport
+        Le transport SSH authentifié.
+    sftp : paramiko.SFTPClient
+        Le client SFTP ouvert sur le transport.
+    last_used : float
+        Moment de la dernière restitution de la connexion au pool.
+    remote_dirs : set
+        Répertoires distants dont l'existence est connue (chemins relatifs au
+        répertoire initial de la connexion).
+    """
+
+    def __init__(self, key, transport, sftp):
+        self.key = key
+        self.transport = transport
+        self.sftp = sftp
+        self.last_used = time.monotonic()
+        self.remote_dirs = set()
+
+    def is_alive(self) -> bool:
+        """
+        Contrôle que la connexion est toujours utilisable.
+
+        Returns
+        -------
+        bool
+            Vrai (True) si la connexion répond, faux (False) autrement.
+        """
+        if not self.transport.is_active():
+            return False
+        try:
+            self.sftp.normalize('.')
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        """
+        Fermeture du client SFTP et du transport.
+        """
+        try:
+            self.sftp.close()
+        finally:
+            self.transport.close()
+
+
+class SftpConnectionPool:
+    """
+    Pool de connexions SFTP partagé par les actions d'un même processus. Les
+    connexions sont identifiées par l'hôte, le port, l'utilisateur et le proxy.
+
+    Parameters
+    ----------
+    idle_timeout : float
+        Durée (en secondes) au-delà de laquelle une connexion inutilisée est fermée
+        (par défaut: 300).
+
+    Attributes
+    ----------
+    idle_timeout : float
+        Durée (en secondes) au-delà de laquelle une connexion inutilisée est fermée.
+    connections_count : int
+        Nombre de connexions ouvertes par le pool.
+    reuses_count : int
+        Nombre de réutilisations de connexions existantes.
+    """
+
+    def __init__(self, idle_timeout=300):
+        self.idle_timeout = idle_timeout
+        self.connections_count = 0
+        self.reuses_count = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connect(self, hostname, port, username, password, proxy_host=None,
+                proxy_port=None):
+        """
+        Emprunt d'une connexion le temps d'un bloc ``with``. La connexion est rendue
+        au pool en fin de bloc, ou fermée si une exception a été levée.
+
+        Parameters
+        ----------
+        hostname : str
+            Adresse du serveur distant.
+        port : int
+            Port du serveur distant.
+        username : str
+            Utilisateur ayant un accès au serveur.
+        password : str
+            Mot de passe de l'utilisateur sur le serveur.
+        proxy_host : str
+            Adresse du proxy, si nécessaire.
+        proxy_port : int
+            Port du proxy si nécessaire.
+
+        Yields
+        ------
+        SftpConnection
+            La connexion empruntée.
+        """
+        connection = self.acquire(hostname, port, username, password, proxy_host,
+                                  proxy_port)
+        try:
+            yield connection
+        except BaseException:
+            self.discard(connection)
+            raise
+        self.release(connection)
+
+    def acquire(self, hostname, port, username, password, proxy_host=None,
+                proxy_port=None) -> SftpConnection:
+        """
+        Emprunt d'une connexion : une connexion inutilisée et valide est réutilisée
+        si possible, sinon une nouvelle connexion est ouverte.
+
+        Returns
+        -------
+        SftpConnection
+            La connexion empruntée.
+        """
+        key = (hostname, int(port), username, proxy_host, proxy_port)
+        self._close_expired()
+
+        while True:
+            with self._lock:
+                connections = self._idle.get(key, [])
+                connection = connections.pop() if connections else None
+            if connection is None:
+                break
+            if connection.is_alive():
+                self.reuses_count += 1
+                return connection
+            connection.close()
+
+        connection = self._open(key, password)
+        self.connections_count += 1
+        return connection
+
+    def release(self, connection):
+        """
+        Restitution d'une connexion au pool.
+
+        Parameters
+        ----------
+        connection : SftpConnection
+            La connexion empruntée.
+        """
+        try:
+            # Retour au répertoire initial pour le prochain utilisateur
+            connection.sftp.chdir(None)
+        except Exception:
+            connection.close()
+            return
+        connection.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(connection.key, []).append(connection)
+
+    @staticmethod
+    def discard(connection):
+        """
+        Fermeture d'une connexion empruntée qui ne doit pas être réutilisée.
+
+        Parameters
+        ----------
+        connection : SftpConnection
+            La connexion empruntée.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """
+        Fermeture de toutes les connexions inutilisées du pool.
+        """
+        with self._lock:
+            connections = [c for conns in self._idle.values() for c in conns]
+            self._idle = {}
+        for connection in connections:
+            self.discard(connection)
+
+    def _close_expired(self):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, connections in self._idle.items():
+                for connection in connections:
+                    if now - connection.last_used > self.idle_timeout:
+                        expired.append(connection)
+                self._idle[key] = [c for c in connections if c not in expired]
+        for connection in expired:
+            self.discard(connection)
+
+    @staticmethod
+    def _open(key, password):
+        hostname, port, username, proxy_host, proxy_port = key
+
+        # Create a transport object for the SFTP connection
+        transport = paramiko.Transport((hostname, port))
+
+        try:
+            if proxy_host:
+                transport.start_client()
+                transport.open_channel('direct-tcpip',
+                                       (hostname, port),
+                                       (proxy_host, proxy_port))
+
+            # Authenticate with the SFTP server
+            transport.connect(username=username, password=password)
+
+            # Create an SFTP client object
+            sftp = transport.open_sftp_client()
+        except BaseException:
+            transport.close()
+            raise
+
+        return SftpConnection(key, transport, sftp)
+
+
+def map_sftp_channels(sftp, function, items, max_channels) -> list:
+    """
+    Applique ``function(sftp, item)`` à chaque élément en répartissant les appels
+    sur plusieurs canaux SFTP ouverts sur le transport déjà authentifié du client
+    fourni. Les canaux supplémentaires sont placés dans le même répertoire distant.
+
+    Parameters
+    ----------
+    sftp : paramiko.SFTPClient
+        Le client SFTP existant.
+    function : callable
+        La fonction à appliquer, appelée avec un client SFTP et un élément.
+    items : list
+        Les éléments à traiter.
+    max_channels : int
+        Le nombre maximal de canaux SFTP à utiliser.
+
+    Returns
+    -------
+    list
+        Les résultats de la fonction, dans l'ordre des éléments.
+    """
+    if max_channels <= 1 or len(items) < 2:
+        return [function(sftp, item) for item in items]
+
+    transport = sftp.get_channel().get_transport()
+    remote_dir = sftp.getcwd()
+    clients = queue.Queue()
+    clients.put(sftp)
+    extra_clients = []
+
+    def call(item):
+        client = clients.get()
+        try:
+            return function(client, item)
+        finally:
+            clients.put(client)
+
+    try:
+        for _ in range(min(max_channels, len(items)) - 1):
+            client = transport.open_sftp_client()
+            if remote_dir:
+                client.chdir(remote_dir)
+            extra_clients.append(client)
+            clients.put(client)
+
+        with ThreadPoolExecutor(max_workers=clients.qsize()) as executor:
+            futures = [executor.submit(call, item) for item in items]
+            return [future.result() for future in futures]
+    finally:
+        for client in extra_clients:
+            client.close()
+
+
+sftp_pool = SftpConnectionPool()
@@ -1,6 +1,8 @@
 import datetime
 import glob
 import importlib
+import json
+import os
 import subprocess
 import tempfile
 from pathlib import Path
@@ -37,6 +39,16 @@ class Controller:
         Liste des actions postérieures à la prévision.
     disseminations : list
         Liste des actions de dissémination.
+    state_file : str
+        Fichier (optionnel) conservant entre les exécutions la liste des pré-actions
+        déjà exécutées avec succès pour une date donnée. Elles ne sont pas répétées
+        lors d'une exécution ultérieure tant que leurs fichiers sont présents.
+    artifacts : ArtifactRegistry
+        Registre des fichiers produits par les post-actions lors de l'exécution en
+        cours, transmis aux disséminations.
+    outbox : Outbox
+        File d'attente (optionnelle) des diffusions ayant échoué, renvoyées lors des
+        exécutions suivantes.
     """
 
     def __init__(self, cli_options):
@@ -53,6 +65,14 @@ class Controller:
         self.pre_actions = []
         self.post_actions = []
         self.disseminations = []
+        self.artifacts = asv.ArtifactRegistry()
+        self.state_file = None
+        if self.options.has('state_file'):
+            self.state_file = self.options.get('state_file')
+        self._pre_actions_done = self._load_pre_actions_state()
+        self.outbox = None
+        if self.options.has('outbox'):
+            self.outbox = asv.Outbox(self.options.get('outbox'))
         self._register_pre_actions()
         self._register_post_actions()
         self._register_disseminations()
@@ -76,6 +96,7 @@ class Controller:
             self.date = date
 
         self._fix_date()
+        self.artifacts.clear()
 
         try:
             self._run_pre_actions()
@@ -91,6 +112,34 @@ class Controller:
             print("La prévision a échoué.")
             print(f"Erreur: {e}")
             return -1
+        finally:
+            asv.sftp_pool.close_all()
+
+        return 0
+
+    def drain(self) -> int:
+        """
+        Nouvelle tentative d'envoi des diffusions en attente, sans exécuter les
+        pré-actions, la prévision ni les post-actions.
+
+        Returns
+        -------
+        int
+            Le code de retour (0 si toutes les diffusions traitées ont réussi)
+        """
+        if not self.outbox:
+            print("Aucune file d'attente de diffusion n'est configurée.")
+            return -1
+
+        try:
+            if not self.outbox.drain(self.disseminations):
+                return -1
+        except Exception as e:
+            print("La reprise des diffusions a échoué.")
+            print(f"Erreur: {e}")
+            return -1
+        finally:
+            asv.sftp_pool.close_all()
 
         return 0
 
@@ -156,14 +205,25 @@ class Controller:
             attempts_step_hours = max(attempts_step_hours, action.attempts_step_hours)
 
         attempts_hours = 0
+        while attempts_hours < attempts_max_hours:
+            if self._pre_actions_data_available():
+                break
+            print("  -> Recul de l'heure de la prévision.")
+            attempts_hours += attempts_step_hours
+            self._back_in_time(attempts_step_hours)
+
         while attempts_hours < attempts_max_hours:
             success = True
             for action in self.pre_actions:
                 print(f"Exécution de : '{action.type_name}' [{action.name}]")
+                if self._is_pre_action_done(action):
+                    print("  -> Déjà exécutée pour cette date.")
+                    continue
                 if not action.run(self.date):
                     attempts_hours += attempts_step_hours
                     success = False
                     break
+                self._set_pre_action_done(action)
             if success:
                 print("  -> Exécution correcte.")
                 break
@@ -174,6 +234,58 @@ class Controller:
             print("  -> Échec de l'exécution.")
             print("  -> Nombre maximum de tentatives atteint pour la pré-action.")
 
+    def _pre_actions_data_available(self):
+        """
+        Contrôle la disponibilité des données de toutes les pré-actions pour la date
+        courante, sans lancer de transfert.
+        """
+        for action in self.pre_actions:
+            if self._is_pre_action_done(action):
+                continue
+            if not action.is_available(self.date):
+                return False
+        return True
+
+    def _get_pre_action_key(self, action):
+        return f"{type(action).__name__}:{action.name}", \
+            self.date.strftime('%Y-%m-%d %H')
+
+    def _is_pre_action_done(self, action):
+        if self._get_pre_action_key(action) not in self._pre_actions_done:
+            return False
+        # Fichiers supprimés depuis l'exécution précédente : la pre-action est relancée
+        return action.has_outputs(self.date)
+
+    def _set_pre_action_done(self, action):
+        self._pre_actions_done.add(self._get_pre_action_key(action))
+        self._save_pre_actions_state()
+
+    def _load_pre_actions_state(self):
+        if not self.state_file or not Path(self.state_file).exists():
+            return set()
+        try:
+            with open(self.state_file, encoding="utf-8") as file:
+                state = json.load(file)
+            return {tuple(item) for item in state['pre_actions']}
+        except Exception as e:
+            print(f"  -> Le fichier d'état n'a pas pu être lu ({e}).")
+            return set()
+
+    def _save_pre_actions_state(self):
+        if not self.state_file:
+            return
+
+        # Seules les dates proches de la prévision sont conservées (7 jours)
+        date_min = self.date - datetime.timedelta(days=7)
+        date_min = date_min.strftime('%Y-%m-%d %H')
+        items = sorted([list(item) for item in self._pre_actions_done
+                        if item[1] >= date_min])
+
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w', encoding="utf-8") as file:
+            json.dump({'pre_actions': items}, file, indent=2)
+        os.replace(tmp_file, self.state_file)
+
     def _run_atmoswing(self):
         """
         Exécution d'AtmoSwing.
@@ -253,13 +365,22 @@ class Controller:
             print("  -> Aucun nouveau fichier à traiter en post-action.")
             return
 
-        for action in self.post_actions:
-            print(f"Exécution de : '{action.type_name}' [{action.name}]")
-            action.feed(files, {'forecast_date': self.date})
-            if action.run():
-                print("  -> Exécution correcte.")
-            else:
-                print("  -> Échec de l'exécution.")
+        # Each forecast file is read once, shared by all post-actions, and released
+        # before the next one
+        for file in files:
+            print(f"Post-actions pour : {Path(file).name}")
+            forecast_file = asv.ForecastFile(file)
+            try:
+                for action in self.post_actions:
+                    print(f"Exécution de : '{action.type_name}' [{action.name}]")
+                    action.feed([forecast_file], {'forecast_date': self.date},
+                                self.artifacts)
+                    if action.run():
+                        print("  -> Exécution correcte.")
+                    else:
+                        print("  -> Échec de l'exécution.")
+            finally:
+                forecast_file.close()
 
     def _run_disseminations(self):
         """
@@ -268,16 +389,20 @@ class Controller:
         if not self.disseminations or len(self.disseminations) == 0:
             return
 
+        if self.outbox:
+            self.outbox.drain(self.disseminations)
+
         for action in self.disseminations:
             print(f"Exécution de : '{action.type_name}' [{action.name}]")
-            local_dir = action.local_dir
-            extension = action.extension
-            files = self._list_files(local_dir, extension)
+            files = self._get_files_for_dissemination(action)
             action.feed(files)
             if action.run(self.date):
                 print("  -> Exécution correcte.")
             else:
                 print("  -> Échec de l'exécution.")
+                if self.outbox:
+                    self.outbox.enqueue(action, self.date, files)
+                    print("  -> Fichiers placés dans la file d'attente de diffusion.")
 
     def _fix_date(self):
         date = self.date
@@ -299,6 +424,15 @@ class Controller:
         files = [x for x in files if x not in self.existing_files]
         return files
 
+    def _get_files_for_dissemination(self, action):
+        local_dir = asv.utils.build_date_dir_structure(action.local_dir, self.date)
+        files = self.artifacts.select(action.extension, action.tag, local_dir)
+        if files:
+            return files
+
+        # Fichiers non produits lors de cette exécution (p. ex. sorties d'AtmoSwing)
+        return self._list_files(action.local_dir, action.extension)
+
     def _list_files(self, local_dir, ext, pattern='%Y-%m-%d_%H'):
         local_dir = asv.utils.build_date_dir_structure(local_dir, self.date)
         pattern = f"{str(local_dir)}/{self.date.strftime(pattern)}{f'.*{ext}'}"
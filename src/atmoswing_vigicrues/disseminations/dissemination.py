@@ -4,10 +4,16 @@ class Dissemination:
 
     Attributes
     ----------
+    tag : str
+        Nom de la post-action dont les fichiers produits sont à diffuser (par
+        défaut: None, tous les fichiers ayant l'extension donnée).
     _file_paths : list
         Chemins des fichiers à diffuser.
     """
 
+    # Class attribute: subclasses call __init__ after setting their own options
+    tag = None
+
     def __init__(self):
         self._file_paths = []
 
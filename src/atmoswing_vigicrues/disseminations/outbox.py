@@ -0,0 +1,226 @@
+import datetime
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+
+class Outbox:
+    """
+    File d'attente persistante des diffusions ayant échoué. Les fichiers sont copiés
+    dans un répertoire local et décrits dans un index, afin d'être renvoyés lors
+    d'une exécution ultérieure sans refaire la prévision.
+
+    Parameters
+    ----------
+    options: dict
+        Un dictionnaire contenant les options de la file d'attente. Les champs
+        possibles sont:
+
+        * directory : str
+            Répertoire local de la file d'attente.
+        * max_attempts : int
+            Nombre maximal de tentatives d'envoi avant abandon (par défaut: 10).
+        * backoff_minutes : float
+            Délai avant la première nouvelle tentative, doublé à chaque échec
+            (par défaut: 5).
+        * backoff_max_hours : float
+            Délai maximal entre deux tentatives (par défaut: 24).
+
+    Attributes
+    ----------
+    directory : str
+        Répertoire local de la file d'attente.
+    index_file : str
+        Chemin de l'index des éléments en attente.
+    max_attempts : int
+        Nombre maximal de tentatives d'envoi avant abandon.
+    backoff_minutes : float
+        Délai avant la première nouvelle tentative.
+    backoff_max_hours : float
+        Délai maximal entre deux tentatives.
+    """
+
+    def __init__(self, options):
+        """
+        Initialisation de l'instance Outbox
+        """
+        self.directory = options['directory']
+        self.index_file = str(Path(self.directory) / 'index.json')
+
+        if 'max_attempts' in options:
+            self.max_attempts = int(options['max_attempts'])
+        else:
+            self.max_attempts = 10
+
+        if 'backoff_minutes' in options:
+            self.backoff_minutes = float(options['backoff_minutes'])
+        else:
+            self.backoff_minutes = 5
+
+        if 'backoff_max_hours' in options:
+            self.backoff_max_hours = float(options['backoff_max_hours'])
+        else:
+            self.backoff_max_hours = 24
+
+    def enqueue(self, action, date, file_paths, now=None):
+        """
+        Mise en attente des fichiers d'une diffusion ayant échoué.
+
+        Parameters
+        ----------
+        action : Dissemination
+            L'action de diffusion ayant échoué.
+        date : datetime.datetime
+            Date de la prévision.
+        file_paths : list
+            Chemins des fichiers à diffuser.
+        now : datetime.datetime
+            Moment de la mise en attente (par défaut, l'heure actuelle).
+        """
+        if not file_paths:
+            return
+
+        now = now or datetime.datetime.utcnow()
+        item_id = uuid.uuid4().hex
+        spool_dir = Path(self.directory) / item_id
+        spool_dir.mkdir(parents=True, exist_ok=True)
+
+        files = []
+        for file in file_paths:
+            if not os.path.isfile(file):
+                continue
+            spool_file = spool_dir / os.path.basename(file)
+            shutil.copy2(file, spool_file)
+            files.append(str(spool_file))
+
+        if not files:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            return
+
+        items = self._load_index()
+        items.append({
+            'id': item_id,
+            'action': self.get_action_key(action),
+            'date': date.strftime('%Y-%m-%d %H'),
+            'files': files,
+            'attempts': 1,
+            'next_attempt': self._get_next_attempt(now, 1),
+        })
+        self._save_index(items)
+
+    def pending(self) -> list:
+        """
+        Liste des éléments en attente.
+
+        Returns
+        -------
+        list
+            Les éléments en attente (dictionnaires de l'index).
+        """
+        return self._load_index()
+
+    def drain(self, actions, now=None) -> bool:
+        """
+        Nouvelle tentative d'envoi des éléments en attente dont le délai est écoulé.
+
+        Parameters
+        ----------
+        actions : list
+            Les actions de diffusion disponibles.
+        now : datetime.datetime
+            Moment de la tentative (par défaut, l'heure actuelle).
+
+        Returns
+        -------
+        bool
+            Vrai (True) si tous les éléments traités ont été envoyés, faux (False)
+            autrement.
+        """
+        items = self._load_index()
+        if not items:
+            return True
+
+        now = now or datetime.datetime.utcnow()
+        actions = {self.get_action_key(action): action for action in actions}
+        success = True
+        remaining = []
+
+        for item in items:
+            action = actions.get(item['action'])
+            if action is None or item['next_attempt'] > self._format_time(now):
+                remaining.append(item)
+                continue
+
+            date = datetime.datetime.strptime(item['date'], '%Y-%m-%d %H')
+            print(f"Reprise de la diffusion : '{action.type_name}' [{action.name}] "
+                  f"pour la date {item['date']}")
+            action.feed(item['files'])
+            if action.run(date):
+                print("  -> Exécution correcte.")
+                self._remove_spool(item)
+                continue
+
+            success = False
+            item['attempts'] += 1
+            if item['attempts'] > self.max_attempts:
+                print("  -> Échec de l'exécution. Nombre maximum de tentatives "
+                      "atteint, abandon de la diffusion.")
+                self._remove_spool(item)
+                continue
+
+            item['next_attempt'] = self._get_next_attempt(now, item['attempts'])
+            print(f"  -> Échec de l'exécution. Nouvelle tentative après le "
+                  f"{item['next_attempt']}.")
+            remaining.append(item)
+
+        self._save_index(remaining)
+
+        return success
+
+    @staticmethod
+    def get_action_key(action) -> str:
+        """
+        Identifiant d'une action de diffusion dans la file d'attente.
+
+        Parameters
+        ----------
+        action : Dissemination
+            L'action de diffusion.
+
+        Returns
+        -------
+        str
+            L'identifiant de l'action (type et nom).
+        """
+        return f"{type(action).__name__}:{action.name}"
+
+    def _get_next_attempt(self, now, attempts):
+        delay = self.backoff_minutes * 2 ** (attempts - 1)
+        delay = min(delay, self.backoff_max_hours * 60)
+        return self._format_time(now + datetime.timedelta(minutes=delay))
+
+    @staticmethod
+    def _format_time(time):
+        return time.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _remove_spool(self, item):
+        shutil.rmtree(Path(self.directory) / item['id'], ignore_errors=True)
+
+    def _load_index(self):
+        if not os.path.isfile(self.index_file):
+            return []
+        try:
+            with open(self.index_file, encoding="utf-8") as file:
+                return json.load(file)['items']
+        except Exception as e:
+            print(f"  -> L'index de la file d'attente n'a pas pu être lu ({e}).")
+            return []
+
+    def _save_index(self, items):
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, 'w', encoding="utf-8") as file:
+            json.dump({'items': items}, file, indent=2)
+        os.replace(tmp_file, self.index_file)
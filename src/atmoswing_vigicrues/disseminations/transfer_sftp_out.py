@@ -1,4 +1,13 @@
+import datetime
+import hashlib
+import io
+import json
 import os
+import posixpath
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
 
 import paramiko
 
@@ -22,6 +31,10 @@ class TransferSftpOut(Dissemination):
             Répertoire local contenant les fichiers à exporter.
         * extension : str
             Extension des fichiers à exporter.
+        * tag : str
+            Nom de la post-action dont les fichiers produits sont à exporter. Par
+            défaut, tous les fichiers produits ayant l'extension donnée sont
+            exportés.
         * hostname : str
             Adresse du serveur pour la diffusion des résultats.
         * port : int
@@ -36,6 +49,34 @@ class TransferSftpOut(Dissemination):
             Port du proxy si nécessaire (par défaut: 1080).
         * remote_dir : str
             Chemin sur le serveur distant où enregistrer les fichiers.
+        * max_channels : int
+            Nombre de canaux SFTP ouverts en parallèle sur la même connexion pour
+            l'envoi des fichiers (par défaut: 1).
+        * confirm : bool
+            Contrôle de la taille du fichier distant après chaque envoi. Sa
+            désactivation permet d'enchaîner les envois sans attendre la réponse du
+            serveur (par défaut: True).
+        * delta_sync : str
+            Envoi des seuls fichiers nouveaux ou modifiés. Options : 'stat'
+            (comparaison de la taille et de la date de modification avec le fichier
+            distant) ou 'manifest' (comparaison avec un registre local des fichiers
+            déjà diffusés : chemin, taille et empreinte). Par défaut, tous les
+            fichiers sont envoyés. Avec l'envoi d'une archive, seul le mode
+            'manifest' est possible : l'archive complète n'est envoyée que si au
+            moins un fichier est nouveau ou modifié.
+        * manifest_file : str
+            Chemin du registre local des fichiers diffusés pour le mode 'manifest'
+            (par défaut: '.transfer_sftp_out.json' dans local_dir).
+        * bundle : str
+            Regroupement des fichiers dans une seule archive compressée envoyée en
+            un seul transfert. Options : 'tar.gz' ou 'zip'. Par défaut, les fichiers
+            sont envoyés individuellement.
+        * bundle_name : str
+            Nom de l'archive, pouvant contenir un format de date (par défaut:
+            '%Y-%m-%d_%H' suivi de l'extension des fichiers et de l'archive).
+        * bundle_manifest : bool
+            Envoi d'un fichier '<archive>.manifest.json' décrivant le contenu de
+            l'archive (nom, taille et empreinte des fichiers) (par défaut: False).
 
     Attributes
     ----------
@@ -47,6 +88,8 @@ class TransferSftpOut(Dissemination):
         Répertoire local contenant les fichiers à exporter.
     extension : str
         Extension des fichiers à exporter.
+    tag : str
+        Nom de la post-action dont les fichiers produits sont à exporter.
     hostname : str
         Adresse du serveur pour la diffusion des résultats.
     port : int
@@ -61,6 +104,20 @@ class TransferSftpOut(Dissemination):
         Port du proxy si nécessaire (par défaut: 1080).
     remote_dir : str
         Chemin sur le serveur distant où enregistrer les fichiers.
+    max_channels : int
+        Nombre de canaux SFTP ouverts en parallèle.
+    confirm : bool
+        Contrôle de la taille du fichier distant après chaque envoi.
+    delta_sync : str
+        Mode d'envoi des seuls fichiers nouveaux ou modifiés ('stat' ou 'manifest').
+    manifest_file : str
+        Chemin du registre local des fichiers diffusés pour le mode 'manifest'.
+    bundle : str
+        Format de l'archive regroupant les fichiers ('tar.gz' ou 'zip').
+    bundle_name : str
+        Nom de l'archive, pouvant contenir un format de date.
+    bundle_manifest : bool
+        Envoi d'un fichier décrivant le contenu de l'archive.
     """
 
     def __init__(self, name, options):
@@ -77,6 +134,11 @@ class TransferSftpOut(Dissemination):
         self.password = options['password']
         self.remote_dir = options['remote_dir']
 
+        if 'tag' in options and options['tag']:
+            self.tag = options['tag']
+        else:
+            self.tag = None
+
         if 'proxy_host' in options and len(options['proxy_host']) > 0:
             self.proxy_host = options['proxy_host']
             if 'proxy_port' in options and len(options['proxy_port']) > 0:
@@ -85,6 +147,52 @@ class TransferSftpOut(Dissemination):
                 self.proxy_port = 1080
         else:
             self.proxy_host = None
+            self.proxy_port = None
+
+        if 'max_channels' in options:
+            self.max_channels = int(options['max_channels'])
+            if self.max_channels < 1:
+                raise ValueError("Le nombre de canaux SFTP doit être supérieur ou "
+                                 "égal à 1.")
+        else:
+            self.max_channels = 1
+
+        if 'confirm' in options:
+            self.confirm = options['confirm']
+        else:
+            self.confirm = True
+
+        self.delta_sync = None
+        if 'delta_sync' in options and options['delta_sync']:
+            self.delta_sync = options['delta_sync']
+            if self.delta_sync not in ['stat', 'manifest']:
+                raise ValueError("Le mode de synchronisation doit être 'stat' ou "
+                                 "'manifest'.")
+
+        if 'manifest_file' in options and options['manifest_file']:
+            self.manifest_file = options['manifest_file']
+        else:
+            self.manifest_file = str(Path(self.local_dir) / '.transfer_sftp_out.json')
+
+        self.bundle = None
+        if 'bundle' in options and options['bundle']:
+            self.bundle = options['bundle']
+            if self.bundle not in ['tar.gz', 'zip']:
+                raise ValueError("Le format d'archive doit être 'tar.gz' ou 'zip'.")
+            if self.delta_sync == 'stat':
+                raise ValueError("Le mode de synchronisation 'stat' n'est pas "
+                                 "compatible avec l'envoi d'une archive.")
+
+        if 'bundle_name' in options and options['bundle_name']:
+            self.bundle_name = options['bundle_name']
+        else:
+            extension = self.extension.lstrip('.')
+            self.bundle_name = f"%Y-%m-%d_%H.{extension}.{self.bundle}"
+
+        if 'bundle_manifest' in options:
+            self.bundle_manifest = options['bundle_manifest']
+        else:
+            self.bundle_manifest = False
 
         super().__init__()
 
@@ -106,35 +214,53 @@ class TransferSftpOut(Dissemination):
             print("  -> Aucun fichier à traiter")
             return False
 
+        file_paths = self._file_paths
+        skipped_files = []
+        manifest = None
+        if self.delta_sync == 'manifest':
+            manifest = self._load_manifest()
+            file_paths, skipped_files = self._filter_with_manifest(
+                manifest, file_paths, date)
+            if not file_paths:
+                self._print_skipped_files(skipped_files)
+                return True
+            if self.bundle:
+                # The archive replaces the remote one: it must contain all the files
+                file_paths = self._file_paths
+                skipped_files = []
+
         try:
-            # Create a transport object for the SFTP connection
-            transport = paramiko.Transport((self.hostname, self.port))
+            # Borrow an authenticated SFTP connection from the shared pool
+            with asv.sftp_pool.connect(self.hostname, self.port, self.username,
+                                       self.password, self.proxy_host,
+                                       self.proxy_port) as connection:
+                sftp = connection.sftp
 
-            if self.proxy_host:
-                transport.start_client()
-                transport.open_channel('direct-tcpip',
-                                       (self.hostname, self.port),
-                                       (self.proxy_host, self.proxy_port))
+                self._chdir_or_makedirs(connection, self._get_remote_path(date))
 
-            # Authenticate with the SFTP server
-            transport.connect(username=self.username, password=self.password)
+                if self.delta_sync == 'stat':
+                    file_paths, skipped_files = self._filter_with_remote_stat(
+                        sftp, file_paths)
 
-            # Create an SFTP client object
-            sftp = transport.open_sftp_client()
+                if self.bundle:
+                    success = self._put_bundle(sftp, file_paths, date)
+                    results = [success] * len(file_paths)
+                else:
+                    results = asv.connections.map_sftp_channels(
+                        sftp, self._put_file, file_paths, self.max_channels)
 
-            self._chdir_or_mkdir(self.remote_dir, sftp)
-            self._chdir_or_mkdir(date.strftime('%Y'), sftp)
-            self._chdir_or_mkdir(date.strftime('%m'), sftp)
-            self._chdir_or_mkdir(date.strftime('%d'), sftp)
+            if manifest is not None:
+                sent_files = [file for file, success in zip(file_paths, results)
+                              if success]
+                self._update_manifest(manifest, sent_files, date)
 
-            for file in self._file_paths:
-                filename = os.path.basename(file)
-                asv.check_file_exists(file)
-                sftp.put(file, filename)
+            self._print_skipped_files(skipped_files)
 
-            # Close the SFTP client and transport objects
-            sftp.close()
-            transport.close()
+            failures_count = results.count(False)
+            if failures_count > 0:
+                print(f"  -> Nombre de fichiers non transférés : {failures_count} "
+                      f"sur {len(results)}.")
+                return False
 
         except paramiko.ssh_exception.PasswordRequiredException as e:
             print(f"SFTP PasswordRequiredException {e}")
@@ -163,10 +289,173 @@ class TransferSftpOut(Dissemination):
 
         return True
 
+    def _put_file(self, sftp, file):
+        filename = os.path.basename(file)
+        try:
+            asv.check_file_exists(file)
+            sftp.put(file, filename, confirm=self.confirm)
+            if self.delta_sync == 'stat':
+                # Remote copy with the local modification time for the next comparison
+                stat = os.stat(file)
+                sftp.utime(filename, (stat.st_atime, stat.st_mtime))
+        except Exception as e:
+            print(f"  -> Échec du transfert de {filename} ({e}).")
+            return False
+        return True
+
+    def _put_bundle(self, sftp, file_paths, date):
+        bundle_name = date.strftime(self.bundle_name)
+        try:
+            for file in file_paths:
+                asv.check_file_exists(file)
+
+            # Archive built in memory (or in a temporary file if too large)
+            with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as bundle:
+                self._write_bundle(bundle, file_paths)
+                bundle_size = bundle.tell()
+                bundle.seek(0)
+                sftp.putfo(bundle, bundle_name, file_size=bundle_size,
+                           confirm=self.confirm)
+
+            if self.bundle_manifest:
+                manifest = self._build_bundle_manifest(bundle_name, file_paths)
+                sftp.putfo(io.BytesIO(manifest), f"{bundle_name}.manifest.json",
+                           confirm=self.confirm)
+        except Exception as e:
+            print(f"  -> Échec du transfert de l'archive {bundle_name} ({e}).")
+            return False
+
+        print(f"  -> Archive {bundle_name} transférée ({len(file_paths)} fichiers).")
+        return True
+
+    def _write_bundle(self, bundle, file_paths):
+        if self.bundle == 'zip':
+            with zipfile.ZipFile(bundle, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for file in file_paths:
+                    archive.write(file, os.path.basename(file))
+        else:
+            with tarfile.open(fileobj=bundle, mode='w:gz') as archive:
+                for file in file_paths:
+                    archive.add(file, os.path.basename(file))
+        bundle.seek(0, io.SEEK_END)
+
+    def _build_bundle_manifest(self, bundle_name, file_paths):
+        manifest = {
+            'bundle': bundle_name,
+            'created': datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'files': [{
+                'name': os.path.basename(file),
+                'size': os.path.getsize(file),
+                'sha256': self._compute_hash(file),
+            } for file in file_paths],
+        }
+        return json.dumps(manifest, indent=2).encode('utf-8')
+
     @staticmethod
-    def _chdir_or_mkdir(dir_path, sftp):
+    def _filter_with_remote_stat(sftp, file_paths):
+        remote_files = {attr.filename: attr for attr in sftp.listdir_attr('.')}
+        files_to_send = []
+        skipped_files = []
+        for file in file_paths:
+            remote_file = remote_files.get(os.path.basename(file))
+            if remote_file is not None and os.path.isfile(file):
+                stat = os.stat(file)
+                if remote_file.st_size == stat.st_size and \
+                        remote_file.st_mtime == int(stat.st_mtime):
+                    skipped_files.append(file)
+                    continue
+            files_to_send.append(file)
+        return files_to_send, skipped_files
+
+    def _filter_with_manifest(self, manifest, file_paths, date):
+        files_to_send = []
+        skipped_files = []
+        for file in file_paths:
+            entry = manifest.get(self._get_manifest_key(file, date))
+            if entry is not None and os.path.isfile(file):
+                stat = os.stat(file)
+                if entry['size'] == stat.st_size and (
+                        entry['mtime'] == stat.st_mtime or
+                        entry['sha256'] == self._compute_hash(file)):
+                    skipped_files.append(file)
+                    continue
+            files_to_send.append(file)
+        return files_to_send, skipped_files
+
+    def _get_manifest_key(self, file, date):
+        remote_path = posixpath.join(self._get_remote_path(date),
+                                     os.path.basename(file))
+        return f"{self.username}@{self.hostname}:{self.port}/{remote_path}"
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_file):
+            return {}
         try:
-            sftp.chdir(dir_path)
-        except OSError:
-            sftp.mkdir(dir_path)
-            sftp.chdir(dir_path)
+            with open(self.manifest_file, encoding="utf-8") as file:
+                return json.load(file)
+        except Exception as e:
+            print(f"  -> Le registre des fichiers diffusés n'a pas pu être lu ({e}).")
+            return {}
+
+    def _update_manifest(self, manifest, sent_files, date):
+        now = datetime.datetime.utcnow()
+        for file in sent_files:
+            stat = os.stat(file)
+            manifest[self._get_manifest_key(file, date)] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'sha256': self._compute_hash(file),
+                'sent': now.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+        # Only recent entries are kept (30 days)
+        date_min = (now - datetime.timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+        manifest = {key: entry for key, entry in manifest.items()
+                    if entry['sent'] >= date_min}
+
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w', encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+    @staticmethod
+    def _compute_hash(file):
+        file_hash = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def _print_skipped_files(skipped_files):
+        if not skipped_files:
+            return
+        saved_bytes = sum([os.path.getsize(file) for file in skipped_files])
+        print(f"  -> Fichiers inchangés non transférés : {len(skipped_files)} "
+              f"({saved_bytes} octets économisés).")
+
+    def _get_remote_path(self, date):
+        return posixpath.join(self.remote_dir, date.strftime('%Y'),
+                              date.strftime('%m'), date.strftime('%d'))
+
+    @staticmethod
+    def _chdir_or_makedirs(connection, remote_path):
+        sftp = connection.sftp
+        if remote_path not in connection.remote_dirs:
+            try:
+                sftp.stat(remote_path)
+            except IOError:
+                # Create all the missing levels in a single pass
+                parts = remote_path.split('/')
+                for i in range(1, len(parts) + 1):
+                    path = '/'.join(parts[0:i])
+                    if not path or path in connection.remote_dirs:
+                        continue
+                    try:
+                        sftp.mkdir(path)
+                    except IOError:
+                        pass
+                    connection.remote_dirs.add(path)
+            connection.remote_dirs.add(remote_path)
+
+        sftp.chdir(remote_path)
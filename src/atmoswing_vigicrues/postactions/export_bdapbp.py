@@ -102,12 +102,14 @@ class ExportBdApBp(PostAction):
             return True
 
         files_count = 0
-        for file in self._file_paths:
-            file = Path(file)
+        for item in self._file_paths:
+            forecast_file = self._open_forecast_file(item)
+            file = Path(item)
 
             # Nom du fichier
             file_path = self._build_file_path(file)
             if file_path.exists():
+                self._register_artifact(file_path)
                 continue
 
             self._reset_status()
@@ -118,15 +120,15 @@ class ExportBdApBp(PostAction):
                 self.message = "Absence du fichier netcdf."
             else:
                 try:
-                    nc_file = asv.Dataset(file, 'r', format='NETCDF4')
+                    forecast_file.open()
+                    nc_file = forecast_file
                 except Exception:
                     self.status = 110
                     self.message = "Fichier netcdf corrompu."
 
             try:
                 metadata = self._create_metadata_block(nc_file)
-                data = self._create_data_block(nc_file)
-                statistics = self._create_statistics_block(nc_file)
+                data, statistics = self._create_data_and_statistics_blocks(nc_file)
             except Exception:
                 metadata = None
                 data = None
@@ -157,9 +159,9 @@ class ExportBdApBp(PostAction):
                     json.dump(data, outfile, indent=4, ensure_ascii=False)
                 else:
                     json.dump(data, outfile, ensure_ascii=False)
+            self._register_artifact(file_path)
 
-            if nc_file:
-                nc_file.close()
+            self._close_forecast_file(forecast_file, item)
 
             files_count += 1
 
@@ -202,18 +204,16 @@ class ExportBdApBp(PostAction):
 
         return block
 
-    def _create_data_block(self, nc_file):
+    def _create_data_and_statistics_blocks(self, nc_file):
         # Extracting variables
-        station_ids = nc_file['station_ids'][:]
-        target_dates = nc_file['target_dates'][:]
-        target_dates = asv.utils.mjd_to_datetime(target_dates)
-        analog_dates = nc_file['analog_dates'][:]
-        analog_dates = asv.utils.mjd_to_datetime(analog_dates)
-        analogs_nb = nc_file['analogs_nb'][:]
-        analog_criteria = nc_file['analog_criteria'][:]
-        analog_values = nc_file['analog_values_raw'][:]
+        station_ids = nc_file.station_ids
+        target_dates = nc_file.target_dates
+        analog_dates = nc_file.analog_dates
+        analogs_nb = nc_file.analogs_nb
+        offsets = nc_file.offsets
+        analog_criteria = nc_file.analog_criteria
 
-        assert analog_values.shape[0] == len(station_ids)
+        assert nc_file['analog_values_raw'].shape[0] == len(station_ids)
 
         time_format_analogs, time_format_target = self._get_time_format(target_dates)
 
@@ -222,101 +222,89 @@ class ExportBdApBp(PostAction):
         else:
             station_ids_slct = station_ids
 
-        block = {}
-        for station_id in station_ids_slct:
-            i_station = np.where(station_ids == station_id)
-            block_target_date = {}
-            for i_target, target_date in enumerate(target_dates):
-                block_analogs = []
-
-                # Get start/end of the analogs
-                start = np.sum(analogs_nb[0:i_target])
-                n_analogs = analogs_nb[i_target]
-                end = start + n_analogs
-
-                # Extract relevant values
-                analog_dates_sub = analog_dates[start:end]
-                analog_criteria_sub = analog_criteria[start:end]
-                analog_values_sub = analog_values[i_station, start:end].flatten()
-
-                # Sort by decreasing precipitation values
-                permutation = (-analog_values_sub).argsort()
-                analog_dates_sub = analog_dates_sub[permutation]
-                analog_criteria_sub = analog_criteria_sub[permutation]
-                analog_values_sub = analog_values_sub[permutation]
-
-                ranks = np.arange(1, n_analogs + 1)[permutation]
+        # Formatting shared by all stations
+        target_dates_str = [d.item().strftime(time_format_target)
+                            for d in target_dates]
+        analog_dates_str = np.array([d.item().strftime(time_format_analogs)
+                                     for d in analog_dates], dtype=object)
+        analog_criteria_rnd = np.array([round(x, 2) for x in analog_criteria.tolist()],
+                                       dtype=object)
+
+        rows = self._get_station_rows(station_ids, station_ids_slct)
+        rows_found = [row for row in rows if row is not None]
+        analog_values = nc_file.get_analog_values(rows_found)
+        frequencies = {}
+
+        data_blocks = [{} for _ in station_ids_slct]
+        statistics_blocks = [{} for _ in station_ids_slct]
+        for i_target, target_date_str in enumerate(target_dates_str):
+            # Get start/end of the analogs
+            start = offsets[i_target]
+            end = offsets[i_target + 1]
+            n_analogs = int(analogs_nb[i_target])
+
+            n_kept = n_analogs
+            if 0 < self.number_analogs < n_analogs:
+                n_kept = self.number_analogs
+
+            # Sort by decreasing precipitation values (all stations at once)
+            analog_values_sub = analog_values[:, start:end]
+            permutations = (-analog_values_sub).argsort(axis=1)
+            analog_values_sub = np.ma.getdata(analog_values_sub)
+            analog_values_sorted = np.take_along_axis(
+                analog_values_sub, permutations, axis=1)
+            statistics_sorted = None
+            if np.isnan(analog_values_sorted).any():
+                # Missing values are listed first in the statistics, but last in
+                # the data block (aligned with the analog dates and criteria)
+                statistics_sorted = np.sort(analog_values_sub, axis=1)[:, ::-1]
+            permutations = permutations[:, :n_kept]
+
+            if n_analogs not in frequencies:
                 frequency = asv.utils.build_cumulative_frequency(n_analogs)
                 frequency = np.flip(frequency)
+                frequencies[n_analogs] = np.round(frequency, 3).tolist()
+            frequency = frequencies[n_analogs]
+
+            analog_dates_sub = analog_dates_str[start:end]
+            analog_criteria_sub = analog_criteria_rnd[start:end]
+
+            i_found = 0
+            for data_block, statistics_block, row in zip(
+                    data_blocks, statistics_blocks, rows):
+                if row is None:
+                    data_block[target_date_str] = []
+                    statistics_block[target_date_str] = []
+                    continue
+                permutation = permutations[i_found]
+                values = [round(x, 2) for x in analog_values_sorted[i_found].tolist()]
+                data_block[target_date_str] = [
+                    list(analog) for analog in zip(
+                        frequency[0:n_kept],
+                        analog_dates_sub[permutation].tolist(),
+                        analog_criteria_sub[permutation].tolist(),
+                        values[0:n_kept])]
+                if statistics_sorted is not None:
+                    values = [round(x, 2) for x in statistics_sorted[i_found].tolist()]
+                statistics_block[target_date_str] = [
+                    list(analog) for analog in zip(frequency, values)]
+                i_found += 1
+
+        data = {}
+        statistics = {}
+        for station_id, data_block, statistics_block in zip(
+                station_ids_slct, data_blocks, statistics_blocks):
+            data[str(station_id)] = data_block
+            statistics[str(station_id)] = statistics_block
+
+        return data, statistics
 
-                if 0 < self.number_analogs < n_analogs:
-                    analog_dates_sub = analog_dates_sub[0:self.number_analogs]
-                    analog_criteria_sub = analog_criteria_sub[0:self.number_analogs]
-                    analog_values_sub = analog_values_sub[0:self.number_analogs]
-                    ranks = ranks[0:self.number_analogs]
-                    frequency = frequency[0:self.number_analogs]
-
-                for i_analog, analog_date in enumerate(analog_dates_sub):
-                    block_analogs.append([
-                        round(frequency[i_analog], 3),
-                        analog_date.item().strftime(time_format_analogs),
-                        round(float(analog_criteria_sub[i_analog]), 2),
-                        round(float(analog_values_sub[i_analog]), 2)
-                    ])
-
-                target_date_str = target_date.item().strftime(time_format_target)
-                block_target_date[target_date_str] = block_analogs
-            block[str(station_id)] = block_target_date
-
-        return block
-
-    def _create_statistics_block(self, nc_file):
-        # Extracting variables
-        station_ids = nc_file['station_ids'][:]
-        target_dates = nc_file['target_dates'][:]
-        target_dates = asv.utils.mjd_to_datetime(target_dates)
-        analogs_nb = nc_file['analogs_nb'][:]
-        analog_values = nc_file['analog_values_raw'][:]
-
-        time_format_analogs, time_format_target = self._get_time_format(target_dates)
-
-        if self.only_relevant_stations:
-            station_ids_slct = self._extract_station_ids(nc_file)
-        else:
-            station_ids_slct = station_ids
-
-        block = {}
-        for station_id in station_ids_slct:
-            i_station = np.where(station_ids == station_id)
-            block_target_date = {}
-            for i_target, target_date in enumerate(target_dates):
-                block_analogs = []
-
-                # Get start/end of the analogs
-                start = np.sum(analogs_nb[0:i_target])
-                n_analogs = analogs_nb[i_target]
-                end = start + n_analogs
-
-                # Extract relevant values
-                analog_values_sub = analog_values[i_station, start:end].flatten()
-
-                # Sort by decreasing precipitation values
-                analog_values_sub = np.sort(analog_values_sub)[::-1]
-
-                frequency = asv.utils.build_cumulative_frequency(n_analogs)
-                frequency = np.flip(frequency)
-
-                for i_analog, analog_value in enumerate(analog_values_sub):
-                    block_analogs.append([
-                        round(frequency[i_analog], 3),
-                        round(float(analog_value), 2)
-                    ])
-
-                target_date_str = target_date.item().strftime(time_format_target)
-                block_target_date[target_date_str] = block_analogs
-            block[str(station_id)] = block_target_date
-
-        return block
+    @staticmethod
+    def _get_station_rows(station_ids, station_ids_slct):
+        station_index = {}
+        for i_station, station_id in enumerate(station_ids.tolist()):
+            station_index.setdefault(station_id, i_station)
+        return [station_index.get(int(station_id)) for station_id in station_ids_slct]
 
     @staticmethod
     def _get_time_format(target_dates):
@@ -1,4 +1,6 @@
 import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -28,6 +30,9 @@ class ExportPrv(PostAction):
             Par défaut : [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
         * combine_stations_in_one_file : bool
             Combinaison des différentes stations (entités) dans un seul fichier.
+        * max_workers : int
+            Nombre de fichiers écrits en parallèle lorsque les stations sont
+            exportées dans des fichiers séparés (par défaut: 1).
 
     Attributes
     ----------
@@ -44,6 +49,8 @@ class ExportPrv(PostAction):
         Par défaut : [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
     combine_stations_in_one_file : bool
         Combinaison des différentes stations (entités) dans un seul fichier.
+    max_workers : int
+        Nombre de fichiers écrits en parallèle (stations dans des fichiers séparés).
     """
 
     def __init__(self, name, options):
@@ -70,6 +77,11 @@ class ExportPrv(PostAction):
         else:
             self.combine_stations_in_one_file = True
 
+        if 'max_workers' in options:
+            self.max_workers = int(options['max_workers'])
+        else:
+            self.max_workers = 1
+
         super().__init__()
 
     def run(self) -> bool:
@@ -87,35 +99,25 @@ class ExportPrv(PostAction):
 
         files_count = 0
         for file in self._file_paths:
-            nc_file = asv.Dataset(file, 'r', format='NETCDF4')
+            nc_file = self._open_forecast_file(file)
             station_ids = self._extract_station_ids(nc_file)
             header_comments = self._create_header_comments(nc_file)
             if self.combine_stations_in_one_file:
                 file_path = self._build_file_path(file)
                 if file_path.exists():
+                    self._register_artifact(file_path)
+                    self._close_forecast_file(nc_file, file)
                     continue
 
                 header_data = self._create_header_data(nc_file, station_ids)
-                content = self._create_content(nc_file, station_ids)
-                full_content = f"{header_comments}{header_data}{content}"
-
-                with open(file_path, 'w', encoding="utf-8", newline='\r\n') as outfile:
-                    outfile.write(full_content)
+                target_dates, quantiles = self._compute_quantiles(nc_file, station_ids)
+                self._write_file(file_path, header_comments, header_data,
+                                 target_dates, quantiles)
+                self._register_artifact(file_path)
             else:
-                for station_id in station_ids:
-                    file_path = self._build_file_path(file, station_id)
-                    if file_path.exists():
-                        continue
+                self._write_station_files(file, nc_file, station_ids, header_comments)
 
-                    header_data = self._create_header_data(nc_file, station_id)
-                    content = self._create_content(nc_file, station_id)
-                    full_content = f"{header_comments}{header_data}{content}"
-
-                    with open(file_path, 'w', encoding="utf-8", newline='\r\n') \
-                            as outfile:
-                        outfile.write(full_content)
-
-            nc_file.close()
+            self._close_forecast_file(nc_file, file)
 
             files_count += 1
 
@@ -156,53 +158,145 @@ class ExportPrv(PostAction):
 
         return header
 
-    def _create_content(self, nc_file, station_ids):
-        # Extracting variables
-        ids = nc_file['station_ids'][:]
-        target_dates = nc_file['target_dates'][:]
-        target_dates = asv.utils.mjd_to_datetime(target_dates)
-        analogs_nb = nc_file['analogs_nb'][:]
-        analog_values = nc_file['analog_values_raw'][:]
-
-        if not self.combine_stations_in_one_file:
-            station_ids = [station_ids]
-
+    def _write_station_files(self, file, nc_file, station_ids, header_comments):
+        file_paths = [self._build_file_path(file, station_id)
+                      for station_id in station_ids]
+        pending = [i for i, file_path in enumerate(file_paths)
+                   if not file_path.exists()]
+
+        # Quantiles of all stations computed at once, then split by station
+        target_dates, quantiles = None, None
+        if pending:
+            target_dates, quantiles = self._compute_quantiles(
+                nc_file, [station_ids[i] for i in pending])
+
+        # Headers prepared beforehand: the netCDF file is not read from the threads
+        headers_data = [self._create_header_data(nc_file, station_ids[i])
+                        for i in pending]
+
+        def write(i_pending):
+            self._write_file(file_paths[pending[i_pending]], header_comments,
+                             headers_data[i_pending], target_dates,
+                             quantiles[:, i_pending:i_pending + 1, :])
+
+        if self.max_workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(write, range(len(pending))))
+        else:
+            for i_pending in range(len(pending)):
+                write(i_pending)
+
+        for file_path in file_paths:
+            self._register_artifact(file_path)
+
+    def _write_file(self, file_path, header_comments, header_data, target_dates,
+                    quantiles):
+        # Written to a temporary file so that an interrupted export is not taken
+        # for an existing file by the next run.
+        tmp_file_path = file_path.with_name(f"{file_path.name}.part")
+        with open(tmp_file_path, 'w', encoding="utf-8", newline='\r\n') as outfile:
+            outfile.write(header_comments)
+            outfile.write(header_data)
+            self._write_content(outfile, target_dates, quantiles)
+        os.replace(tmp_file_path, file_path)
+
+    def _write_content(self, outfile, target_dates, quantiles):
         time_format_target = self._get_time_format(target_dates)
+        quantiles = np.round(quantiles, 2).reshape(len(target_dates), -1)
 
-        content = ""
+        for target_date, values in zip(target_dates, quantiles.tolist()):
+            target_date_str = target_date.item().strftime(time_format_target)
+            values_str = "".join(map(";{}".format, values))
+            outfile.write(f"{target_date_str}{values_str}\n")
 
-        for i_target, target_date in enumerate(target_dates):
+    def _compute_quantiles(self, nc_file, station_ids):
+        # Extracting variables
+        ids = nc_file.station_ids
+        target_dates = nc_file.target_dates
+        analogs_nb = nc_file.analogs_nb
+        offsets = nc_file.offsets
+
+        rows = self._get_station_rows(ids, station_ids)
+        analog_values = nc_file.get_analog_values(rows)
+        frequencies = np.asarray(self.frequencies, dtype=float)
+        weights = {}
+
+        quantiles = np.empty((len(target_dates), len(rows), len(frequencies)))
+        for i_target in range(len(target_dates)):
             # Get start/end of the analogs
-            start = np.sum(analogs_nb[0:i_target])
-            n_analogs = analogs_nb[i_target]
+            start = offsets[i_target]
+            n_analogs = int(analogs_nb[i_target])
             end = start + n_analogs
 
-            target_date_str = target_date.item().strftime(time_format_target)
-            new_line = target_date_str
-
-            for station_id in station_ids:
-                i_station = np.where(ids == station_id)
-                if len(i_station[0]) == 0:
-                    raise RuntimeError("La station n'a pas été trouvée lors de "
-                                       "l'export PRV.")
-                if len(i_station[0]) > 1:
-                    raise RuntimeError("Le nombre d'entités trouvées est supérieur à 1"
-                                       " lors de l'export PRV.")
-                # Extract relevant values and build frequencies
-                analog_values_sub = analog_values[i_station, start:end]
-                analog_values_sub = np.sort(analog_values_sub).flatten()
-                frequencies = asv.utils.build_cumulative_frequency(n_analogs)
-
-                for freq in self.frequencies:
-                    if len(frequencies) != len(analog_values_sub):
-                        raise RuntimeError("La taille des vecteurs dans l'export PRV "
-                                           "n'est pas cohérente.")
-                    val = np.interp(freq, frequencies, analog_values_sub)
-                    new_line += f";{round(val, 2)}"
-
-            content += f"{new_line}\n"
-
-        return content
+            # Sort the values of all stations at once
+            analog_values_sub = np.sort(analog_values[:, start:end], axis=1)
+            analog_values_sub = np.ma.getdata(analog_values_sub).astype(float)
+            if len(frequencies) > 0 and analog_values_sub.shape[1] != n_analogs:
+                raise RuntimeError("La taille des vecteurs dans l'export PRV "
+                                   "n'est pas cohérente.")
+
+            if n_analogs not in weights:
+                weights[n_analogs] = self._get_interpolation_weights(
+                    n_analogs, frequencies)
+            quantiles[i_target] = self._interpolate(analog_values_sub,
+                                                    *weights[n_analogs])
+
+        return target_dates, quantiles
+
+    @staticmethod
+    def _get_station_rows(ids, station_ids):
+        station_rows = {}
+        for i_station, station_id in enumerate(ids.tolist()):
+            station_rows.setdefault(station_id, []).append(i_station)
+
+        rows = []
+        for station_id in station_ids:
+            i_station = station_rows.get(int(station_id), [])
+            if len(i_station) == 0:
+                raise RuntimeError("La station n'a pas été trouvée lors de "
+                                   "l'export PRV.")
+            if len(i_station) > 1:
+                raise RuntimeError("Le nombre d'entités trouvées est supérieur à 1"
+                                   " lors de l'export PRV.")
+            rows.append(i_station[0])
+
+        return rows
+
+    @staticmethod
+    def _get_interpolation_weights(n_analogs, frequencies):
+        # Interpolation scheme of np.interp(freq, xp, fp) for all frequencies, where
+        # xp are the cumulative frequencies of n_analogs sorted values.
+        xp = asv.utils.build_cumulative_frequency(n_analogs)
+        j = np.searchsorted(xp, frequencies, side='right') - 1
+
+        i_node = np.clip(j, 0, n_analogs - 1)
+        use_node = (j < 0) | (j >= n_analogs - 1) | (xp[i_node] == frequencies)
+
+        i_lo = np.clip(j, 0, max(n_analogs - 2, 0))
+        i_hi = np.minimum(i_lo + 1, n_analogs - 1)
+        dx_lo = frequencies - xp[i_lo]
+        dx_hi = frequencies - xp[i_hi]
+        denom = xp[i_hi] - xp[i_lo]
+
+        return use_node, i_node, i_lo, i_hi, dx_lo, dx_hi, denom
+
+    @staticmethod
+    def _interpolate(values, use_node, i_node, i_lo, i_hi, dx_lo, dx_hi, denom):
+        fp_lo = values[:, i_lo]
+        fp_hi = values[:, i_hi]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (fp_hi - fp_lo) / denom
+            result = slope * dx_lo + fp_lo
+
+            # If we get nan in one direction, try the other (as np.interp)
+            is_nan = np.isnan(result)
+            if is_nan.any():
+                result = np.where(is_nan, slope * dx_hi + fp_hi, result)
+                is_nan = np.isnan(result) & (fp_lo == fp_hi)
+                result = np.where(is_nan, fp_lo, result)
+
+        return np.where(use_node, values[:, i_node], result)
 
     def _get_output_path(self, date):
         local_path = asv.build_date_dir_structure(self.output_dir, date)
@@ -0,0 +1,168 @@
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import atmoswing_vigicrues as asv
+
+
+class ForecastFile(os.PathLike):
+    """
+    Lecture d'un fichier de prévision d'AtmoSwing (netCDF) partagée entre les
+    post-actions. Le fichier n'est ouvert qu'au premier accès et chaque variable
+    n'est lue (et convertie) qu'une seule fois.
+
+    Parameters
+    ----------
+    path : str|Path
+        Chemin du fichier de prévision.
+
+    Attributes
+    ----------
+    path : Path
+        Chemin du fichier de prévision.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._dataset = None
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def __fspath__(self):
+        return str(self.path)
+
+    def __str__(self):
+        return str(self.path)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self.open()[key]
+
+    def __getattr__(self, name):
+        # Attributs globaux du fichier netCDF (p. ex. method_id)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._get_cached(f"attr:{name}", lambda: self.open().getncattr(name))
+
+    def open(self):
+        """
+        Ouverture du fichier netCDF (si ce n'est pas déjà fait).
+
+        Returns
+        -------
+        netCDF4.Dataset
+            Le fichier netCDF ouvert.
+        """
+        with self._lock:
+            if self._dataset is None:
+                if not asv.has_netcdf:
+                    raise ImportError("Le paquet netCDF4 est requis pour cette "
+                                      "action.")
+                self._dataset = asv.Dataset(self.path, 'r', format='NETCDF4')
+            return self._dataset
+
+    def close(self):
+        """
+        Fermeture du fichier netCDF et libération des variables déjà lues. Un accès
+        ultérieur rouvre le fichier.
+        """
+        with self._lock:
+            if self._dataset is not None:
+                self._dataset.close()
+                self._dataset = None
+            self._cache = {}
+
+    @property
+    def station_ids(self):
+        """Identifiants des stations (entités) du fichier."""
+        return self._get_cached('station_ids', lambda: self['station_ids'][:])
+
+    @property
+    def relevant_station_ids(self):
+        """Identifiants des stations pour lesquelles la méthode a été calibrée."""
+        return self._get_cached('relevant_station_ids', lambda: [
+            int(i) for i in self.predictand_station_ids.split(",")])
+
+    @property
+    def target_dates(self):
+        """Dates cibles de la prévision (datetime64)."""
+        return self._get_cached('target_dates', lambda: asv.utils.mjd_to_datetime(
+            self['target_dates'][:]))
+
+    @property
+    def analogs_nb(self):
+        """Nombre d'analogues pour chaque date cible."""
+        return self._get_cached('analogs_nb', lambda: self['analogs_nb'][:])
+
+    @property
+    def offsets(self):
+        """Position des analogues de chaque date cible (taille : n + 1)."""
+        return self._get_cached('offsets', lambda: np.concatenate(
+            ([0], np.cumsum(self.analogs_nb))))
+
+    @property
+    def analog_dates(self):
+        """Dates des analogues (datetime64)."""
+        return self._get_cached('analog_dates', lambda: asv.utils.mjd_to_datetime(
+            self['analog_dates'][:]))
+
+    @property
+    def analog_criteria(self):
+        """Valeurs du critère de similarité des analogues."""
+        return self._get_cached('analog_criteria', lambda: self['analog_criteria'][:])
+
+    @property
+    def analog_values_raw(self):
+        """Valeurs brutes des analogues (stations x analogues)."""
+        return self._get_cached('analog_values_raw',
+                                lambda: self['analog_values_raw'][:])
+
+    def get_analog_values(self, rows=None):
+        """
+        Valeurs brutes des analogues pour une sélection de stations. Seules les
+        lignes demandées sont lues dans le fichier netCDF (sauf si la matrice
+        complète est déjà chargée ou si toutes les stations sont demandées).
+
+        Parameters
+        ----------
+        rows : list
+            Indices des stations (lignes de la matrice), dans l'ordre souhaité.
+            Par défaut, toutes les stations.
+
+        Returns
+        -------
+        numpy.ma.MaskedArray
+            Les valeurs des analogues (stations sélectionnées x analogues).
+        """
+        if rows is None:
+            return self.analog_values_raw
+
+        rows = [int(row) for row in rows]
+        unique_rows = sorted(set(rows))
+
+        with self._lock:
+            if 'analog_values_raw' in self._cache or \
+                    len(unique_rows) == len(self.station_ids):
+                return self.analog_values_raw[rows, :]
+
+            rows_cache = self._cache.setdefault('analog_values_rows', {})
+            missing = [row for row in unique_rows if row not in rows_cache]
+            if missing:
+                # Hyperslab read of the missing rows only (sorted indices)
+                values = self['analog_values_raw'][missing, :]
+                for i, row in enumerate(missing):
+                    rows_cache[row] = values[i]
+
+        if not rows:
+            variable = self['analog_values_raw']
+            return np.ma.empty((0, variable.shape[1]), dtype=variable.dtype)
+
+        return np.ma.stack([rows_cache[row] for row in rows])
+
+    def _get_cached(self, key, loader):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = loader()
+            return self._cache[key]
@@ -1,3 +1,6 @@
+import atmoswing_vigicrues as asv
+
+
 class PostAction:
     """
     Classe de base pour les opérations de traitement des résultats d'AtmoSwing.
@@ -5,28 +8,36 @@ class PostAction:
     Attributes
     ----------
     _file_paths : list
-        Chemins des fichiers de prévision émis par AtmoSwing.
+        Chemins des fichiers de prévision émis par AtmoSwing, ou fichiers de
+        prévision partagés (instances de ForecastFile).
     _metadata : dict
         Méta-données issues de la prévision.
+    _artifacts : ArtifactRegistry
+        Registre des fichiers produits lors de l'exécution.
     """
 
     def __init__(self):
         self._file_paths = []
         self._metadata = None
+        self._artifacts = None
 
-    def feed(self, file_paths, metadata):
+    def feed(self, file_paths, metadata, artifacts=None):
         """
         Transmission des données issues de la prévision
 
         Parameters
         ----------
         file_paths : list
-            Chemins des fichiers de prévision émis par AtmoSwing.
+            Chemins des fichiers de prévision émis par AtmoSwing, ou fichiers de
+            prévision partagés entre les post-actions (instances de ForecastFile).
         metadata : dict
             Méta-données issues de la prévision.
+        artifacts : ArtifactRegistry
+            Registre (optionnel) dans lequel enregistrer les fichiers produits.
         """
         self._file_paths = file_paths
         self._metadata = metadata
+        self._artifacts = artifacts
 
     def run(self) -> bool:
         """
@@ -39,6 +50,22 @@ class PostAction:
         """
         raise NotImplementedError
 
+    @staticmethod
+    def _open_forecast_file(file):
+        if isinstance(file, asv.ForecastFile):
+            return file
+        return asv.ForecastFile(file)
+
+    @staticmethod
+    def _close_forecast_file(forecast_file, file):
+        # Shared forecast files are closed by their owner (the controller)
+        if forecast_file is not file:
+            forecast_file.close()
+
+    def _register_artifact(self, file_path):
+        if self._artifacts is not None:
+            self._artifacts.register(file_path, self.name)
+
     def _get_metadata(self, key):
         if key in self._metadata:
             return self._metadata[key]
@@ -1,13 +1,39 @@
 import datetime
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 
 import atmoswing_vigicrues as asv
 
 from .preaction import PreAction
 
 CLEAN_HTML = re.compile('<.*?>')
+CHUNK_SIZE = 1024 * 1024
+
+# Identifiants GRIB2 (discipline, catégorie, numéro) des variables de NOMADS
+GRIB2_PARAMETERS = {
+    'tmp': (0, 0, 0),
+    'dpt': (0, 0, 6),
+    'spfh': (0, 1, 0),
+    'rh': (0, 1, 1),
+    'pwat': (0, 1, 3),
+    'prate': (0, 1, 7),
+    'apcp': (0, 1, 8),
+    'clwmr': (0, 1, 22),
+    'ugrd': (0, 2, 2),
+    'vgrd': (0, 2, 3),
+    'vvel': (0, 2, 8),
+    'absv': (0, 2, 10),
+    'pres': (0, 3, 0),
+    'prmsl': (0, 3, 1),
+    'hgt': (0, 3, 5),
+    'mslet': (0, 3, 192),
+    'tcdc': (0, 6, 1),
+    'cwat': (0, 6, 6),
+}
 
 
 class DownloadGfsData(PreAction):
@@ -55,6 +81,20 @@ class DownloadGfsData(PreAction):
         * time_step_back : int
             Nombre de pas de temps autorisé pour rechercher d'anciens fichiers
             Valeur par défaut : 4
+        * max_workers : int
+            Nombre de téléchargements simultanés.
+            Valeur par défaut : 1 (téléchargements séquentiels)
+        * pool_size : int
+            Nombre maximal de connexions HTTP conservées ouvertes vers le serveur.
+            Valeur par défaut : 10 (ou max_workers si supérieur)
+        * batch_variables : bool
+            Téléchargement de toutes les variables d'une échéance en une seule
+            requête, puis séparation locale en un fichier par variable.
+            Valeur par défaut : False
+        * probe_availability : bool
+            Contrôle de la publication de la dernière échéance de la prévision (requête
+            HEAD sur le fichier d'index de NOMADS) avant le téléchargement.
+            Valeur par défaut : True
 
     Attributes
     ----------
@@ -80,6 +120,14 @@ class DownloadGfsData(PreAction):
         Pas de temps auquel décrémenter la date pour rechercher d'anciens fichiers
     time_step_back : int
         Nombre de pas de temps autorisé pour rechercher d'anciens fichiers
+    max_workers : int
+        Nombre de téléchargements simultanés.
+    pool_size : int
+        Nombre maximal de connexions HTTP conservées ouvertes vers le serveur.
+    batch_variables : bool
+        Téléchargement de toutes les variables d'une échéance en une seule requête.
+    probe_availability : bool
+        Contrôle de la publication de la prévision avant le téléchargement.
     """
 
     def __init__(self, name, options):
@@ -146,6 +194,37 @@ class DownloadGfsData(PreAction):
         else:
             self.time_step_back = 4
 
+        if 'max_workers' in options:
+            self.max_workers = int(options['max_workers'])
+            if self.max_workers < 1:
+                raise ValueError("Le nombre de téléchargements simultanés doit être "
+                                 "supérieur ou égal à 1.")
+        else:
+            self.max_workers = 1
+
+        if 'pool_size' in options:
+            self.pool_size = int(options['pool_size'])
+        else:
+            self.pool_size = max(10, self.max_workers)
+
+        if 'batch_variables' in options:
+            self.batch_variables = options['batch_variables']
+        else:
+            self.batch_variables = False
+
+        if self.batch_variables:
+            for variable in self.variables:
+                if variable.lower() not in GRIB2_PARAMETERS:
+                    raise ValueError(f"La variable GFS '{variable}' ne peut pas être "
+                                     f"téléchargée en mode groupé.")
+
+        if 'probe_availability' in options:
+            self.probe_availability = options['probe_availability']
+        else:
+            self.probe_availability = True
+
+        self._session = None
+
         super().__init__()
 
     def run(self, date) -> bool:
@@ -164,6 +243,69 @@ class DownloadGfsData(PreAction):
         """
         return self.download(date)
 
+    def is_available(self, date) -> bool:
+        """
+        Contrôle que la dernière échéance de la prévision a été publiée sur NOMADS.
+        Aucune requête n'est effectuée si les fichiers sont déjà présents localement.
+
+        Parameters
+        ----------
+        date: datetime.datetime
+            Date d'émission de la prévision.
+
+        Returns
+        -------
+        bool
+            Faux (False) si la prévision n'est pas encore publiée, vrai (True)
+            autrement (y compris si le contrôle n'a pas pu être effectué).
+        """
+        if not self.probe_availability or self.has_outputs(date):
+            return True
+
+        url = self._build_index_url(date)
+        try:
+            with self._create_session() as session:
+                r = session.head(url, timeout=30)
+        except Exception:
+            return True
+
+        if r.status_code == 404:
+            date_msg = date.strftime('%d/%m/%Y %Hh')
+            print(f"  -> Prévisions GFS du {date_msg} pas encore disponibles.")
+            return False
+
+        return True
+
+    def has_outputs(self, date) -> bool:
+        """
+        Contrôle que les fichiers téléchargés pour une date d'émission de la
+        prévision sont toujours présents.
+
+        Parameters
+        ----------
+        date: datetime.datetime
+            Date d'émission de la prévision.
+
+        Returns
+        -------
+        bool
+            Faux (False) si des fichiers manquent, vrai (True) autrement.
+        """
+        for time_step_back in range(0, self.time_step_back):
+            date_ref = date - datetime.timedelta(
+                hours=self.time_increment * time_step_back
+            )
+            forecast_date, forecast_hour = self._format_forecast_date(date_ref)
+            local_path = asv.build_date_dir_structure(self.output_dir, date_ref)
+            for lead_time in range(0, self.lead_time_max + 1, 6):
+                for variable in self.variables:
+                    file_name = f'{forecast_date}{forecast_hour}.NWS_GFS.' \
+                                f'{variable.lower()}.{lead_time:03d}.grib2'
+                    if not (local_path / file_name).exists():
+                        return False
+
+        return True
+
     def download(self, date) -> bool:
         """
         Télécharge les prévisions de GFS pour une date d'émission de la prévision.
@@ -185,6 +327,15 @@ class DownloadGfsData(PreAction):
         if resol == '0p50':
             sub_product = 'pgrb2full'
 
+        self._session = self._create_session()
+        try:
+            return self._download(date, subregion, levels, resol, sub_product)
+        finally:
+            self._print_connection_stats()
+            self._session.close()
+            self._session = None
+
+    def _download(self, date, subregion, levels, resol, sub_product):
         files_count = 0
         for time_step_back in range(0, self.time_step_back):
             date_ref = date - datetime.timedelta(
@@ -195,51 +346,247 @@ class DownloadGfsData(PreAction):
             print(f"  -> Téléchargement des prévisions du : {date_msg}.")
             forecast_date, forecast_hour = self._format_forecast_date(date_ref)
 
+            local_path = self._get_local_path(date_ref)
+            downloads = []
+
             for lead_time in range(0, self.lead_time_max + 1, 6):
                 lead_time_str = f'{lead_time:03d}'
 
+                file_paths = {}
                 for variable in self.variables:
-
-                    url = f"https://nomads.ncep.noaa.gov/cgi-bin/filter_gfs_{resol}." \
-                          f"pl?file=gfs.t{forecast_hour}z.{sub_product}.{resol}." \
-                          f"f{lead_time_str}&{levels}var_{variable.upper()}=on&" \
-                          f"{subregion}&dir=%2Fgfs.{forecast_date}%2F" \
-                          f"{forecast_hour}%2Fatmos"
-
                     file_name = f'{forecast_date}{forecast_hour}.NWS_GFS.' \
                                 f'{variable.lower()}.{lead_time_str}.grib2'
 
-                    local_path = self._get_local_path(date_ref)
                     file_path = local_path / file_name
 
                     if file_path.exists():
                         continue
 
-                    try:
-                        if self.proxies:
-                            r = requests.get(url, proxies=self.proxies)
-                        else:
-                            r = requests.get(url)
-                    except requests.exceptions.RequestException as e:
-                        print(f"  -> {e}")
-                        print("  -> Le téléchargement de GFS a échoué.")
-                        return False
-                    except Exception:
-                        print("  -> Le téléchargement de GFS a échoué.")
-                        return False
+                    file_paths[variable] = file_path
 
-                    if r.status_code == 200:
-                        open(file_path, 'wb').write(r.content)
-                        files_count += 1
-                    else:
-                        clean_text = re.sub(CLEAN_HTML, '', r.text)
-                        print(f"  -> {clean_text}")
-                        return False
+                if self.batch_variables:
+                    if file_paths:
+                        variables = ''.join([f'var_{variable.upper()}=on&'
+                                             for variable in file_paths])
+                        url = self._build_url(forecast_date, forecast_hour,
+                                              lead_time_str, levels, variables,
+                                              subregion, resol, sub_product)
+                        downloads.append((url, file_paths))
+                    continue
+
+                for variable, file_path in file_paths.items():
+                    url = self._build_url(forecast_date, forecast_hour,
+                                          lead_time_str, levels,
+                                          f'var_{variable.upper()}=on&',
+                                          subregion, resol, sub_product)
+                    downloads.append((url, {variable: file_path}))
+
+            if not self._download_files(downloads):
+                return False
+
+            files_count += sum([len(file_paths) for _, file_paths in downloads])
 
         print(f"  -> Nombre de fichiers téléchargés : {files_count}.")
 
         return True
 
+    def _download_files(self, downloads):
+        if self.max_workers == 1 or len(downloads) < 2:
+            for url, file_paths in downloads:
+                if not self._download_item(url, file_paths):
+                    return False
+            return True
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._download_item, url, file_paths)
+                       for url, file_paths in downloads]
+            success = True
+            for future in futures:
+                if not future.result():
+                    success = False
+                    # Inutile de poursuivre les téléchargements en attente
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+        return success
+
+    def _download_item(self, url, file_paths):
+        if not self.batch_variables:
+            file_path = next(iter(file_paths.values()))
+            return self._download_file(url, file_path)
+
+        # Fichier temporaire regroupant toutes les variables de l'échéance
+        file_path = next(iter(file_paths.values()))
+        batch_path = file_path.with_name(f'{file_path.name}.batch')
+        if not self._download_file(url, batch_path):
+            return False
+
+        try:
+            return self._split_grib_messages(batch_path, file_paths)
+        finally:
+            self._remove_file(batch_path)
+
+    def _split_grib_messages(self, batch_path, file_paths):
+        variables = {GRIB2_PARAMETERS[variable.lower()]: variable
+                     for variable in file_paths}
+        tmp_paths = {variable: file_path.with_name(f'{file_path.name}.part')
+                     for variable, file_path in file_paths.items()}
+        outputs = {}
+
+        try:
+            with open(batch_path, 'rb') as grib:
+                while True:
+                    message = self._read_grib_message(grib)
+                    if message is None:
+                        break
+                    variable = variables.get(self._get_grib_parameter(message))
+                    if variable is None:
+                        continue
+                    if variable not in outputs:
+                        outputs[variable] = open(tmp_paths[variable], 'wb')
+                    outputs[variable].write(message)
+        except Exception as e:
+            print(f"  -> {e}")
+            print("  -> La séparation des variables GFS a échoué.")
+            success = False
+        else:
+            success = True
+        finally:
+            for output in outputs.values():
+                output.close()
+
+        missing = [variable for variable in file_paths if variable not in outputs]
+        if success and missing:
+            print(f"  -> Variables absentes de la réponse GFS : {', '.join(missing)}.")
+            success = False
+
+        if not success:
+            for tmp_path in tmp_paths.values():
+                self._remove_file(tmp_path)
+            return False
+
+        for variable, file_path in file_paths.items():
+            os.replace(tmp_paths[variable], file_path)
+
+        return True
+
+    @staticmethod
+    def _read_grib_message(grib):
+        header = grib.read(16)
+        if not header:
+            return None
+        if len(header) < 16 or header[0:4] != b'GRIB' or header[7] != 2:
+            raise ValueError("Le fichier reçu n'est pas au format GRIB2.")
+        length = int.from_bytes(header[8:16], byteorder='big')
+        body = grib.read(length - 16)
+        if len(body) != length - 16:
+            raise ValueError("Le fichier GRIB2 reçu est tronqué.")
+        return header + body
+
+    @staticmethod
+    def _get_grib_parameter(message):
+        discipline = message[6]
+        position = 16
+        while position + 5 <= len(message) and \
+                message[position:position + 4] != b'7777':
+            section_length = int.from_bytes(message[position:position + 4],
+                                            byteorder='big')
+            if message[position + 4] == 4:
+                category = message[position + 9]
+                number = message[position + 10]
+                return discipline, category, number
+            position += section_length
+        return None
+
+    def _download_file(self, url, file_path):
+        tmp_file_path = file_path.with_name(f'{file_path.name}.part')
+        try:
+            with self._session.get(url, stream=True) as r:
+                if r.status_code != 200:
+                    clean_text = re.sub(CLEAN_HTML, '', r.text)
+                    print(f"  -> {clean_text}")
+                    return False
+
+                with open(tmp_file_path, 'wb') as file:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        file.write(chunk)
+
+            # Le fichier n'est visible sous son nom définitif qu'une fois complet
+            os.replace(tmp_file_path, file_path)
+
+        except requests.exceptions.RequestException as e:
+            print(f"  -> {e}")
+            print("  -> Le téléchargement de GFS a échoué.")
+            self._remove_file(tmp_file_path)
+            return False
+        except Exception:
+            print("  -> Le téléchargement de GFS a échoué.")
+            self._remove_file(tmp_file_path)
+            return False
+
+        return True
+
+    @staticmethod
+    def _remove_file(file_path):
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _build_url(forecast_date, forecast_hour, lead_time_str, levels, variables,
+                   subregion, resol, sub_product):
+        return f"https://nomads.ncep.noaa.gov/cgi-bin/filter_gfs_{resol}." \
+               f"pl?file=gfs.t{forecast_hour}z.{sub_product}.{resol}." \
+               f"f{lead_time_str}&{levels}{variables}" \
+               f"{subregion}&dir=%2Fgfs.{forecast_date}%2F" \
+               f"{forecast_hour}%2Fatmos"
+
+    def _build_index_url(self, date):
+        forecast_date, forecast_hour = self._format_forecast_date(date)
+        resol = self.resolution
+        sub_product = 'pgrb2'
+        if resol == '0p50':
+            sub_product = 'pgrb2full'
+        lead_time_last = 6 * (self.lead_time_max // 6)
+        return f"https://nomads.ncep.noaa.gov/pub/data/nccf/com/gfs/prod/" \
+               f"gfs.{forecast_date}/{forecast_hour}/atmos/gfs.t{forecast_hour}z." \
+               f"{sub_product}.{resol}.f{lead_time_last:03d}.idx"
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if self.proxies:
+            session.proxies.update(self.proxies)
+        return session
+
+    def _print_connection_stats(self):
+        connections_count, requests_count = self._get_connection_stats()
+        if requests_count == 0:
+            return
+        reused_count = max(requests_count - connections_count, 0)
+        print(f"  -> Connexions HTTP ouvertes : {connections_count}, "
+              f"requêtes : {requests_count}, réutilisations : {reused_count}.")
+
+    def _get_connection_stats(self):
+        connections_count = 0
+        requests_count = 0
+        for adapter in set(self._session.adapters.values()):
+            managers = [adapter.poolmanager]
+            managers.extend(adapter.proxy_manager.values())
+            for manager in managers:
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    connections_count += pool.num_connections
+                    requests_count += pool.num_requests
+        return connections_count, requests_count
+
     def _get_local_path(self, date):
         local_path = asv.build_date_dir_structure(self.output_dir, date)
         local_path.mkdir(parents=True, exist_ok=True)
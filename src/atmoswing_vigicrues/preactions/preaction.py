@@ -22,6 +22,44 @@ class PreAction:
         """
         raise NotImplementedError
 
+    def is_available(self, date) -> bool:
+        """
+        Contrôle peu coûteux de la disponibilité des données pour une date, avant
+        l'exécution de la pre-action. Par défaut, les données sont considérées comme
+        disponibles.
+
+        Parameters
+        ----------
+        date : datetime.datetime
+            Date de la prévision.
+
+        Returns
+        -------
+        bool
+            Faux (False) si les données ne sont certainement pas disponibles, vrai
+            (True) autrement.
+        """
+        return True
+
+    def has_outputs(self, date) -> bool:
+        """
+        Contrôle que les fichiers produits par la pre-action pour une date sont
+        toujours présents localement. Une pre-action déjà exécutée (selon le fichier
+        d'état) n'est ignorée que si ses fichiers sont présents. Par défaut, ce
+        contrôle n'est pas possible et les fichiers sont considérés comme présents.
+
+        Parameters
+        ----------
+        date : datetime.datetime
+            Date de la prévision.
+
+        Returns
+        -------
+        bool
+            Faux (False) si des fichiers manquent, vrai (True) autrement.
+        """
+        return True
+
     def _set_attempts_attributes(self, options):
         if 'attempts_max_hours' in options:
             self.attempts_max_hours = options['attempts_max_hours']
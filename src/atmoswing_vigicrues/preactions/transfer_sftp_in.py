@@ -1,5 +1,7 @@
 import fnmatch
 import os
+import re
+import shutil
 import tarfile
 from pathlib import Path
 
@@ -9,6 +11,8 @@ import atmoswing_vigicrues as asv
 
 from .preaction import PreAction
 
+ARCHIVE_SUFFIXES = ['.gz', '.tgz', '.xz', '.txz', '.bz2', '.tbz', '.tbz2', '.tb2']
+
 
 class TransferSftpIn(PreAction):
     """
@@ -45,6 +49,22 @@ class TransferSftpIn(PreAction):
             Décalage temporel autorisé pour rechercher d'anciens fichiers
         * attempts_step_hours : int
             Pas de temps auquel décrémenter la date pour rechercher d'anciens fichiers
+        * max_channels : int
+            Nombre de canaux SFTP ouverts en parallèle sur la même connexion pour
+            le téléchargement des fichiers (par défaut: 1).
+        * prefetch : bool
+            Lecture anticipée (requêtes en pipeline) des fichiers distants
+            (par défaut: True).
+        * buffer_size : int
+            Taille du tampon de lecture en octets (par défaut: 32768).
+        * stream_unpack : bool
+            Extraction des archives au fil du téléchargement, sans attendre la fin
+            du transfert (par défaut: False). Le transfert d'une archive
+            interrompu (fichier '.part') est repris puis l'archive est extraite à
+            la fin du transfert.
+        * keep_archive : bool
+            Conservation locale des archives extraites au fil du téléchargement
+            (par défaut: True).
 
     Attributes
     ----------
@@ -72,6 +92,16 @@ class TransferSftpIn(PreAction):
         Adresse du proxy, si nécessaire.
     proxy_port : int
         Port du proxy si nécessaire (par défaut: 1080).
+    max_channels : int
+        Nombre de canaux SFTP ouverts en parallèle.
+    prefetch : bool
+        Lecture anticipée (requêtes en pipeline) des fichiers distants.
+    buffer_size : int
+        Taille du tampon de lecture en octets.
+    stream_unpack : bool
+        Extraction des archives au fil du téléchargement.
+    keep_archive : bool
+        Conservation locale des archives extraites au fil du téléchargement.
     """
 
     def __init__(self, name, options):
@@ -103,6 +133,35 @@ class TransferSftpIn(PreAction):
                 self.proxy_port = 1080
         else:
             self.proxy_host = None
+            self.proxy_port = None
+
+        if 'max_channels' in options:
+            self.max_channels = int(options['max_channels'])
+            if self.max_channels < 1:
+                raise ValueError("Le nombre de canaux SFTP doit être supérieur ou "
+                                 "égal à 1.")
+        else:
+            self.max_channels = 1
+
+        if 'prefetch' in options:
+            self.prefetch = options['prefetch']
+        else:
+            self.prefetch = True
+
+        if 'buffer_size' in options:
+            self.buffer_size = int(options['buffer_size'])
+        else:
+            self.buffer_size = 32768
+
+        if 'stream_unpack' in options:
+            self.stream_unpack = options['stream_unpack']
+        else:
+            self.stream_unpack = False
+
+        if 'keep_archive' in options:
+            self.keep_archive = options['keep_archive']
+        else:
+            self.keep_archive = True
 
         super().__init__()
 
@@ -121,46 +180,31 @@ class TransferSftpIn(PreAction):
             Vrai (True) en cas de succès, faux (False) autrement.
         """
         try:
+            # Borrow an authenticated SFTP connection from the shared pool
+            with asv.sftp_pool.connect(self.hostname, self.port, self.username,
+                                       self.password, self.proxy_host,
+                                       self.proxy_port) as connection:
+                sftp = connection.sftp
 
-            # Check if files already in the local folder (only with defined variables)
-            if self.variables is not None:
-                if self._files_already_present(date):
-                    print("  -> Fichiers déjà présents localement.")
-                    return True
-
-            # Create a transport object for the SFTP connection
-            transport = paramiko.Transport((self.hostname, self.port))
+                # Change the directory to the desired remote directory
+                sftp.chdir(self.remote_dir)
 
-            if self.proxy_host:
-                transport.start_client()
-                transport.open_channel('direct-tcpip',
-                                       (self.hostname, self.port),
-                                       (self.proxy_host, self.proxy_port))
+                # List the remote directory once (with the files attributes)
+                remote_files = sftp.listdir_attr('.')
 
-            # Authenticate with the SFTP server
-            transport.connect(username=self.username, password=self.password)
+                # Download files
+                local_path = Path(self._get_local_path(date))
+                forecast_datetime = date.strftime("%Y%m%d%H")
+                f_exist_dt, f_new_dt = self._get_files(sftp, remote_files,
+                                                       forecast_datetime, local_path)
 
-            # Create an SFTP client object
-            sftp = transport.open_sftp_client()
+                if f_exist_dt + f_new_dt == 0:
+                    print(f"  -> Pas de fichier disponible pour {forecast_datetime}.")
+                    return False
 
-            # Change the directory to the desired remote directory
-            sftp.chdir(self.remote_dir)
-
-            # Download files
-            local_path = Path(self._get_local_path(date))
-            forecast_datetime = date.strftime("%Y%m%d%H")
-            f_exist_dt, f_new_dt = self._get_files(sftp, forecast_datetime, local_path)
-
-            if f_exist_dt + f_new_dt == 0:
-                print(f"  -> Pas de fichier disponible pour {forecast_datetime}.")
-                return False
-
-            forecast_date = date.strftime("%Y%m%d")
-            f_exist_d, f_new_d = self._get_files(sftp, forecast_date, local_path)
-
-            # Close the SFTP client and transport objects
-            sftp.close()
-            transport.close()
+                forecast_date = date.strftime("%Y%m%d")
+                f_exist_d, f_new_d = self._get_files(sftp, remote_files, forecast_date,
+                                                     local_path)
 
             print(f"  -> Nombre de fichiers existants : {f_exist_d - f_new_dt}.")
             print(f"  -> Nombre de fichiers récupérés : {f_new_dt + f_new_d}.")
@@ -192,28 +236,169 @@ class TransferSftpIn(PreAction):
 
         return True
 
-    def _get_files(self, sftp, forecast_date, local_path):
+    def has_outputs(self, date) -> bool:
+        """
+        Contrôle que les fichiers récupérés pour une date sont toujours présents.
+
+        Parameters
+        ----------
+        date : datetime.datetime
+            Date de la prévision.
+
+        Returns
+        -------
+        bool
+            Faux (False) si des fichiers manquent, vrai (True) autrement.
+        """
+        if self.variables is not None:
+            return self._files_already_present(date)
+
+        local_path = asv.build_date_dir_structure(self.local_dir, date)
+        forecast_datetime = date.strftime("%Y%m%d%H")
+        return any(local_file.suffix != '.part' for local_file
+                   in local_path.glob(f'*{forecast_datetime}*'))
+
+    def _get_files(self, sftp, remote_files, forecast_date, local_path):
+        patterns = self._compile_patterns(forecast_date)
         files_count_existing = 0
-        files_count_new = 0
-        for remote_file in sftp.listdir('.'):
-            pattern = f'{self.prefix.lower()}*_{forecast_date}*.*'
-            if self.variables is not None:
-                for variable in self.variables:
-                    pattern = f'{self.prefix.lower()}_{variable.lower()}' \
-                              f'_{forecast_date}*.*'
-                    if fnmatch.fnmatch(remote_file.lower(), pattern):
+        files_to_get = []
+        for remote_file in remote_files:
+            file_name = remote_file.filename.lower()
+            if not any(pattern.match(file_name) for pattern in patterns):
+                continue
+
+            # Only keep local files that are complete (same size as the remote file)
+            local_file = local_path / remote_file.filename
+            if local_file.exists() and \
+                    local_file.stat().st_size == remote_file.st_size:
+                files_count_existing += 1
+                continue
+            if self._already_unpacked(remote_file, local_path):
+                files_count_existing += 1
+                continue
+            files_to_get.append(remote_file)
+
+        self._get_remote_files(sftp, files_to_get, local_path)
+
+        return files_count_existing, len(files_to_get)
+
+    def _compile_patterns(self, forecast_date):
+        if self.variables is None:
+            patterns = [f'{self.prefix.lower()}*_{forecast_date}*.*']
+        else:
+            patterns = [f'{self.prefix.lower()}_{variable.lower()}_{forecast_date}*.*'
+                        for variable in self.variables]
+        return [re.compile(fnmatch.translate(pattern)) for pattern in patterns]
+
+    def _get_remote_files(self, sftp, remote_files, local_path):
+        asv.connections.map_sftp_channels(
+            sftp, lambda client, remote_file: self._get_remote_file(
+                client, remote_file, local_path),
+            remote_files, self.max_channels)
+
+    def _get_remote_file(self, sftp, remote_file, local_path):
+        local_file = local_path / remote_file.filename
+        tmp_file = local_path / f'{remote_file.filename}.part'
+
+        # Streaming starts from byte 0: an interrupted transfer is resumed instead
+        stream_unpack = self.stream_unpack and self._is_archive(remote_file.filename)
+        if stream_unpack and not tmp_file.exists():
+            self._get_and_unpack_remote_file(sftp, remote_file, local_path)
+            return
+
+        # Resume an interrupted transfer from the size already received
+        offset = 0
+        if tmp_file.exists():
+            offset = tmp_file.stat().st_size
+            if offset > remote_file.st_size:
+                offset = 0
+
+        with sftp.open(remote_file.filename, 'rb', self.buffer_size) as remote:
+            if offset > 0:
+                remote.seek(offset)
+            if self.prefetch:
+                remote.prefetch(remote_file.st_size)
+            with open(tmp_file, 'ab' if offset > 0 else 'wb') as local:
+                while True:
+                    data = remote.read(self.buffer_size)
+                    if not data:
                         break
+                    local.write(data)
+
+        if tmp_file.stat().st_size != remote_file.st_size:
+            raise IOError(f"Le transfert du fichier {remote_file.filename} est "
+                          f"incomplet.")
+
+        os.replace(tmp_file, local_file)
+        self._unpack_if_needed(local_file, local_path)
+
+        if stream_unpack and not self.keep_archive:
+            self._get_unpacked_marker(local_file).write_text(
+                str(remote_file.st_size))
+            local_file.unlink()
+
+    def _get_and_unpack_remote_file(self, sftp, remote_file, local_path):
+        local_file = local_path / remote_file.filename
+        tmp_file = local_path / f'{remote_file.filename}.part'
+
+        with sftp.open(remote_file.filename, 'rb', self.buffer_size) as remote:
+            if self.prefetch:
+                remote.prefetch(remote_file.st_size)
+
+            archive_copy = None
+            if self.keep_archive:
+                archive_copy = open(tmp_file, 'wb')
+
+            try:
+                # Members are extracted as the stream arrives (pipe mode)
+                stream = _TeeReader(remote, archive_copy)
+                with tarfile.open(fileobj=stream, mode='r|*') as file:
+                    for member in file:
+                        if member.isreg():
+                            self._extract_member(file, member, local_path)
+
+                # Read the end of the archive (padding) to get a complete copy
+                while archive_copy and stream.read(self.buffer_size):
+                    pass
+            finally:
+                if archive_copy:
+                    archive_copy.close()
+
+        if not self.keep_archive:
+            self._get_unpacked_marker(local_file).write_text(
+                str(remote_file.st_size))
+            return
+
+        if tmp_file.stat().st_size != remote_file.st_size:
+            raise IOError(f"Le transfert du fichier {remote_file.filename} est "
+                          f"incomplet.")
+
+        os.replace(tmp_file, local_file)
 
-            if fnmatch.fnmatch(remote_file.lower(), pattern):
-                local_file = local_path / remote_file
-                if local_file.exists():
-                    files_count_existing += 1
-                    continue
-                sftp.get(remote_file, str(local_file), prefetch=False)
-                self._unpack_if_needed(local_file, local_path)
-                files_count_new += 1
+    @staticmethod
+    def _extract_member(file, member, local_path):
+        target = local_path / os.path.basename(member.name)
+        tmp_target = local_path / f'{target.name}.part'
+        source = file.extractfile(member)
+        with open(tmp_target, 'wb') as output:
+            shutil.copyfileobj(source, output)
+        os.replace(tmp_target, target)
+
+    def _already_unpacked(self, remote_file, local_path):
+        if not self.stream_unpack or self.keep_archive:
+            return False
+        marker = self._get_unpacked_marker(local_path / remote_file.filename)
+        if not marker.exists():
+            return False
+        return marker.read_text().strip() == str(remote_file.st_size)
+
+    @staticmethod
+    def _get_unpacked_marker(local_file):
+        return local_file.with_name(f'{local_file.name}.unpacked')
 
-        return files_count_existing, files_count_new
+    @staticmethod
+    def _is_archive(file_name):
+        return Path(file_name).suffix.lower() in ARCHIVE_SUFFIXES
 
     @staticmethod
     def _chdir_or_mkdir(dir_path, sftp):
@@ -238,6 +423,8 @@ class TransferSftpIn(PreAction):
             local_files = local_path.glob(pattern)
             file_found = False
             for local_file in local_files:
+                if local_file.suffix == '.part':
+                    continue
                 if fnmatch.fnmatch(str(local_file.name).lower(), pattern):
                     file_found = True
                     break
@@ -248,11 +435,26 @@ class TransferSftpIn(PreAction):
 
     @staticmethod
     def _unpack_if_needed(local_file, local_path):
-        if local_file.suffix in ['.gz', '.tgz', '.xz', '.txz', '.bz2',
-                                 '.tbz', '.tbz2', '.tb2']:
+        if local_file.suffix in ARCHIVE_SUFFIXES:
             file = tarfile.open(local_file)
             for member in file.getmembers():
                 if member.isreg():
                     member.name = os.path.basename(member.name)
                     file.extract(member, local_path)
             file.close()
+
+
+class _TeeReader:
+    """
+    Lecture d'un flux avec copie (optionnelle) des données lues dans un fichier.
+    """
+
+    def __init__(self, source, copy=None):
+        self._source = source
+        self._copy = copy
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        if self._copy is not None and data:
+            self._copy.write(data)
+        return data
@@ -1,3 +1,5 @@
+from pathlib import Path
+
 import atmoswing_vigicrues as asv
 
 from .preaction import PreAction
@@ -115,6 +117,30 @@ class TransformEcmwfData(PreAction):
 
         return True
 
+    def has_outputs(self, date) -> bool:
+        """
+        Contrôle que les fichiers transformés pour une date d'émission de la
+        prévision sont toujours présents.
+
+        Parameters
+        ----------
+        date: datetime.datetime
+            Date d'émission de la prévision.
+
+        Returns
+        -------
+        bool
+            Faux (False) si des fichiers manquent, vrai (True) autrement.
+        """
+        forecast_date, forecast_hour = self._format_forecast_date(date)
+        for variable in self.variables:
+            new_file_name = f'{forecast_date}{forecast_hour}.ECMWF_IFS.' \
+                            f'{variable.lower()}.nc'
+            if not (Path(self.output_dir) / new_file_name).exists():
+                return False
+
+        return True
+
     def _get_input_dir(self, date):
         return asv.build_date_dir_structure(self.input_dir, date)
 
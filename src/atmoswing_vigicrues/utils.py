@@ -128,35 +128,31 @@ def jd_to_date(jd):
 
     Parameters
     ----------
-    jd: float
+    jd: float or ndarray
         Le nombre de jour julien.
 
     Returns
     -------
-    year: int
+    year: int or ndarray
         L'année.
-    month: int
+    month: int or ndarray
         Le mois.
-    day: int
-        Le jour.
+    day: float or ndarray
+        Le jour (avec la fraction de jour).
 
     Examples
     --------
     >>> jd_to_date(2460096.5)
-    (2023, 6, 1)
+    (2023, 6, 1.0)
     """
-    jd = jd + 0.5
+    is_scalar = np.isscalar(jd)
+    jd = np.asarray(jd) + 0.5
 
     f, i = np.modf(jd)
     i = i.astype(int)
 
     a = np.trunc((i - 1867216.25) / 36524.25)
-    b = np.zeros(len(jd))
-
-    idx = tuple([i > 2299160])
-    b[idx] = i[idx] + 1 + a[idx] - np.trunc(a[idx] / 4.)
-    idx = tuple([i <= 2299160])
-    b[idx] = i[idx]
+    b = np.where(i > 2299160, i + 1 + a - np.trunc(a / 4.), i)
 
     c = b + 1524
     d = np.trunc((c - 122.1) / 365.25)
@@ -164,16 +160,11 @@ def jd_to_date(jd):
     g = np.trunc((c - e) / 30.6001)
 
     day = c - e + f - np.trunc(30.6001 * g)
+    month = np.where(g < 13.5, g - 1, g - 13).astype(int)
+    year = np.where(month > 2.5, d - 4716, d - 4715).astype(int)
 
-    month = np.zeros(len(jd))
-    month[g < 13.5] = g[g < 13.5] - 1
-    month[g >= 13.5] = g[g >= 13.5] - 13
-    month = month.astype(int)
-
-    year = np.zeros(len(jd))
-    year[month > 2.5] = d[month > 2.5] - 4716
-    year[month <= 2.5] = d[month <= 2.5] - 4715
-    year = year.astype(int)
+    if is_scalar:
+        return year.item(), month.item(), day.item()
 
     return year, month, day
 
@@ -228,19 +219,18 @@ def mjd_to_datetime(mjd):
     >>> mjd_to_datetime(np.array([59215.5, 59216.5]))
     array(['2021-01-01T12:00:00', '2021-01-02T12:00:00'], dtype='datetime64[s]')
     """
-    jd = mjd + 2400000.5
-    year, month, day = jd_to_date(jd)
+    jd = np.asarray(mjd) + 2400000.5
+    year, month, day = map(np.asarray, jd_to_date(jd))
 
     frac_days, day = np.modf(day)
     day = day.astype(int)
 
     hour, minute = days_to_hours_mins(frac_days)
 
-    date = np.empty(len(mjd), dtype='datetime64[s]')
-
-    for idx, _ in enumerate(year):
-        date[idx] = datetime.datetime(year[idx], month[idx], day[idx],
-                                      hour[idx], minute[idx], 0, 0)
+    months = (year - 1970) * 12 + (month - 1)
+    date = months.astype('datetime64[M]').astype('datetime64[s]')
+    date += (day - 1).astype('timedelta64[D]')
+    date += (hour * 60 + minute).astype('timedelta64[m]')
 
     return date
 
@@ -0,0 +1,21 @@
+import os
+
+import atmoswing_vigicrues as asv
+
+
+class FakeDissemination(asv.Dissemination):
+    def __init__(self, name='Fake', failures=0, local_dir=None):
+        self.type_name = "Fake dissemination"
+        self.name = name
+        self.local_dir = local_dir
+        self.extension = '.nc'
+        self.failures = failures
+        self.runs = []
+        super().__init__()
+
+    def run(self, date):
+        self.runs.append((date, [os.path.basename(f) for f in self._file_paths]))
+        if self.failures > 0:
+            self.failures -= 1
+            return False
+        return all(os.path.isfile(f) for f in self._file_paths)
@@ -0,0 +1,96 @@
+import pytest
+
+import atmoswing_vigicrues as asv
+
+# Needs a running docker container (see files/sftp-docker-instructions.txt)
+RUN_SFTP = False
+
+SERVER = ('127.0.0.1', 4422, 'foo', 'pass')
+
+
+class FakeSftp:
+    def chdir(self, path):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnection(asv.SftpConnection):
+    def __init__(self, key, alive=True):
+        super().__init__(key, None, FakeSftp())
+        self.alive = alive
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    pool = asv.SftpConnectionPool()
+    pool._open = lambda key, password: FakeConnection(key)
+    return pool
+
+
+def test_pool_reuses_released_connections(pool):
+    connection = pool.acquire(*SERVER)
+    pool.release(connection)
+    assert pool.acquire(*SERVER) is connection
+    assert pool.connections_count == 1
+    assert pool.reuses_count == 1
+
+
+def test_pool_separates_keys(pool):
+    connection = pool.acquire(*SERVER)
+    pool.release(connection)
+    other = pool.acquire('127.0.0.1', 4422, 'bar', 'pass')
+    assert other is not connection
+    assert pool.connections_count == 2
+
+
+def test_pool_drops_dead_connections(pool):
+    connection = pool.acquire(*SERVER)
+    pool.release(connection)
+    connection.alive = False
+    assert pool.acquire(*SERVER) is not connection
+    assert connection.closed
+
+
+def test_pool_closes_idle_connections(pool):
+    pool.idle_timeout = 0
+    connection = pool.acquire(*SERVER)
+    pool.release(connection)
+    connection.last_used -= 1
+    assert pool.acquire(*SERVER) is not connection
+    assert connection.closed
+
+
+def test_pool_discards_connection_on_error(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connect(*SERVER) as connection:
+            raise RuntimeError()
+    assert connection.closed
+    assert pool.acquire(*SERVER) is not connection
+
+
+def test_pool_close_all(pool):
+    connection = pool.acquire(*SERVER)
+    pool.release(connection)
+    pool.close_all()
+    assert connection.closed
+
+
+def test_pool_shares_sftp_connection():
+    if RUN_SFTP:
+        pool = asv.SftpConnectionPool()
+        with pool.connect(*SERVER) as connection:
+            connection.sftp.chdir('some/dir')
+        with pool.connect(*SERVER) as connection_reused:
+            assert connection_reused is connection
+            assert connection_reused.sftp.getcwd() is None
+        pool.close_all()
+        assert pool.connections_count == 1
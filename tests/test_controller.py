@@ -1,11 +1,16 @@
+import glob
 import importlib
 import os
 import shutil
 import tempfile
 import types
 import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
 
 import pytest
+import requests
+from fakes import FakeDissemination
 
 import atmoswing_vigicrues as asv
 
@@ -44,6 +49,29 @@ def tmp_dir():
     return tmp_dir
 
 
+class FakePreAction(asv.PreAction):
+    def __init__(self, name, available_from=None, failing_dates=()):
+        self.type_name = "Fake pre-action"
+        self.name = name
+        self.available_from = available_from
+        self.failing_dates = failing_dates
+        self.outputs = True
+        self.attempts_max_hours = 24
+        self.attempts_step_hours = 6
+        self.dates = []
+        super().__init__()
+
+    def is_available(self, date):
+        return self.available_from is None or date <= self.available_from
+
+    def run(self, date):
+        self.dates.append(date)
+        return self.is_available(date) and date not in self.failing_dates
+
+    def has_outputs(self, date):
+        return self.outputs
+
+
 def get_controller_with_fixed_paths_full(options, tmp_dir):
     controller = asv.Controller(options)
     controller.pre_actions[0].output_dir = DIR_PATH + '/__data_cache__'
@@ -199,3 +227,192 @@ def test_flux_stops_when_preprocess_failing(tmp_dir):
     if RUN_ATMOSWING:
         controller.run()
     shutil.rmtree(tmp_dir)
+
+
+def test_pre_actions_skip_unavailable_dates():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    controller = asv.Controller(options)
+    action = FakePreAction('Fake', datetime(2022, 10, 1, 6))
+    controller.pre_actions = [action]
+    controller.date = datetime(2022, 10, 1, 18)
+    controller._run_pre_actions()
+    assert action.dates == [datetime(2022, 10, 1, 6)]
+    assert controller.date == datetime(2022, 10, 1, 6)
+
+
+def test_pre_actions_use_cached_gfs_files(monkeypatch):
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    controller = asv.Controller(options)
+    action = controller.pre_actions[0]
+    date = datetime(2022, 10, 1, 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        action.output_dir = tmp
+        action.time_step_back = 1
+        local_path = action._get_local_path(date)
+        for lead_time in range(0, action.lead_time_max + 1, 6):
+            for variable in action.variables:
+                file_name = f'2022100100.NWS_GFS.{variable.lower()}.' \
+                            f'{lead_time:03d}.grib2'
+                (local_path / file_name).touch()
+
+        # NOMADS no longer provides this date
+        def head(session, url, **kwargs):
+            response = requests.Response()
+            response.status_code = 404
+            return response
+
+        monkeypatch.setattr(requests.Session, 'head', head)
+        controller.date = date
+        controller._run_pre_actions()
+        assert controller.date == date
+
+
+def test_pre_actions_done_are_not_probed():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    controller = asv.Controller(options)
+    date = datetime(2022, 10, 1, 12)
+    action = FakePreAction('Fake', available_from=datetime(2022, 10, 1, 6))
+    controller.pre_actions = [action]
+    controller.date = date
+    controller._set_pre_action_done(action)
+    controller._run_pre_actions()
+    assert controller.date == date
+    assert action.dates == []
+
+
+def test_pre_actions_are_not_run_twice_for_a_date():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    date = datetime(2022, 10, 1, 12)
+    date_back = datetime(2022, 10, 1, 6)
+
+    def run_pre_actions(state_file, pre_actions):
+        controller = asv.Controller(options)
+        controller.state_file = state_file
+        controller._pre_actions_done = controller._load_pre_actions_state()
+        controller.pre_actions = pre_actions
+        controller.date = date
+        controller._run_pre_actions()
+        return controller
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_file = tmp + '/state.json'
+
+        # The second pre-action fails: both are run again for an earlier date
+        action = FakePreAction('Fake')
+        action_other = FakePreAction('Other', failing_dates=[date])
+        controller = run_pre_actions(state_file, [action, action_other])
+        assert action.dates == [date, date_back]
+        assert action_other.dates == [date, date_back]
+        assert controller.date == date_back
+
+        # Later run: only the pre-action that failed is run again
+        action = FakePreAction('Fake')
+        action_other = FakePreAction('Other')
+        run_pre_actions(state_file, [action, action_other])
+        assert action.dates == []
+        assert action_other.dates == [date]
+
+        # Files removed since: the pre-action is run again
+        action = FakePreAction('Fake')
+        action.outputs = False
+        run_pre_actions(state_file, [action])
+        assert action.dates == [date]
+
+
+def test_failed_disseminations_are_enqueued_and_drained():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    with tempfile.TemporaryDirectory() as tmp:
+        controller = asv.Controller(options)
+        controller.outbox = asv.Outbox({'directory': tmp, 'backoff_minutes': 0})
+        action = FakeDissemination(
+            failures=1, local_dir=DIR_PATH + '/files/atmoswing-forecasts-v2.1')
+        controller.disseminations = [action]
+        controller.date = datetime(2022, 12, 16)
+        controller._run_disseminations()
+        assert len(controller.outbox.pending()) == 1
+
+        assert controller.drain() == 0
+        assert len(action.runs) == 2
+        assert len(action.runs[1][1]) == 4
+        assert controller.outbox.pending() == []
+
+
+def test_disseminations_use_registered_artifacts():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    controller = asv.Controller(options)
+    files_dir = DIR_PATH + '/files/atmoswing-forecasts-v2.1'
+    action = FakeDissemination(local_dir=files_dir)
+    controller.date = datetime(2022, 12, 16)
+
+    # Fallback on the files found in the local directory
+    assert len(controller._get_files_for_dissemination(action)) == 4
+
+    files = glob.glob(files_dir + '/2022/12/16/*.nc')
+    controller.artifacts.register(files[0], 'Export')
+    controller.artifacts.register(files[1], 'Other')
+    assert controller._get_files_for_dissemination(action) == files[0:2]
+    action.tag = 'Other'
+    assert controller._get_files_for_dissemination(action) == [files[1]]
+
+
+def test_disseminations_use_artifacts_of_their_local_dir():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    controller = asv.Controller(options)
+    controller.date = datetime(2022, 12, 16)
+    files_dir = DIR_PATH + '/files/atmoswing-forecasts-v2.1'
+    files = glob.glob(files_dir + '/2022/12/16/*.nc')
+    other_files = glob.glob(files_dir + '/2022/10/01/*.nc')
+    controller.artifacts.register(files[0], 'Export')
+    controller.artifacts.register(other_files[0], 'Export')
+
+    # Only the registered files of the local directory, without stale files
+    action = FakeDissemination(local_dir=files_dir)
+    assert action.tag is None
+    assert controller._get_files_for_dissemination(action) == [files[0]]
+
+    # No registered file in the local directory (e.g. files exported by
+    # AtmoSwing): fallback on the files found in the directory
+    with tempfile.TemporaryDirectory() as tmp:
+        file = Path(tmp) / '2022' / '12' / '16' / '2022-12-16_00.test.nc'
+        file.parent.mkdir(parents=True)
+        file.touch()
+        action = FakeDissemination(local_dir=tmp)
+        assert controller._get_files_for_dissemination(action) == [str(file)]
+
+
+class FakePostAction(asv.PostAction):
+    def __init__(self):
+        self.type_name = "Fake post-action"
+        self.name = "Fake"
+        self.forecast_files = []
+        super().__init__()
+
+    def run(self):
+        self.forecast_files.append(list(self._file_paths))
+        return all(len(f.station_ids) > 0 for f in self._file_paths)
+
+
+def test_post_actions_share_forecast_files():
+    options = types.SimpleNamespace(
+        config_file=DIR_PATH + '/files/config_gfs_download.yaml')
+    controller = asv.Controller(options)
+    action_1 = FakePostAction()
+    action_2 = FakePostAction()
+    controller.post_actions = [action_1, action_2]
+    controller.options.config['atmoswing'] = {
+        'with': {'output_dir': DIR_PATH + '/files/atmoswing-forecasts-v2.1'}}
+    controller.date = datetime(2022, 12, 16)
+    controller._run_post_actions()
+    assert len(action_1.forecast_files) == 4
+    for shared, other in zip(action_1.forecast_files, action_2.forecast_files):
+        assert shared == other
+        assert len(shared) == 1
+        assert shared[0]._dataset is None
+        assert shared[0]._cache == {}
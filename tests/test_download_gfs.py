@@ -5,6 +5,7 @@ import types
 from datetime import datetime, timedelta
 
 import pytest
+import requests
 
 import atmoswing_vigicrues as asv
 
@@ -90,3 +91,150 @@ def test_download_gfs_entire_atmosphere_var(options):
     assert action.run(date)
     assert count_files_recursively(options) == 3 * 4
     shutil.rmtree(options['output_dir'])
+
+
+def test_download_gfs_concurrent_succeeds(options):
+    options['max_workers'] = 4
+    action = asv.DownloadGfsData('Download GFS data', options)
+    date = datetime.utcnow() - timedelta(days=1)
+    assert action.download(date)
+    assert count_files_recursively(options) == 3 * 4 * 2
+    shutil.rmtree(options['output_dir'])
+
+
+def test_download_gfs_fails_if_max_workers_invalid(options):
+    options['max_workers'] = 0
+    with pytest.raises(ValueError):
+        asv.DownloadGfsData('Download GFS data', options)
+
+
+def test_download_gfs_session_is_pooled(options):
+    options['max_workers'] = 12
+    options['proxies'] = {'http': 'http://127.0.0.1:3128', 'https': ''}
+    action = asv.DownloadGfsData('Download GFS data', options)
+    session = action._create_session()
+    adapter = session.get_adapter('https://nomads.ncep.noaa.gov')
+    assert adapter._pool_maxsize == 12
+    assert session.proxies['http'] == 'http://127.0.0.1:3128'
+    session.close()
+
+
+def test_download_gfs_failure_leaves_no_partial_file(options):
+    action = asv.DownloadGfsData('Download GFS data', options)
+    action._session = action._create_session()
+    file_path = action._get_local_path(datetime(2022, 10, 1)) / 'file.grib2'
+    assert action._download_file('http://127.0.0.1:1/file', file_path) is False
+    action._session.close()
+    assert count_files_recursively(options) == 0
+    shutil.rmtree(options['output_dir'])
+
+
+def test_download_gfs_has_outputs(options):
+    options['time_step_back'] = 1
+    action = asv.DownloadGfsData('Download GFS data', options)
+    date = datetime(2022, 10, 1)
+    assert not action.has_outputs(date)
+    local_path = action._get_local_path(date)
+    for lead_time in range(0, action.lead_time_max + 1, 6):
+        for variable in action.variables:
+            file_name = f'2022100100.NWS_GFS.{variable.lower()}.{lead_time:03d}.grib2'
+            (local_path / file_name).touch()
+    assert action.has_outputs(date)
+    os.remove(local_path / file_name)
+    assert not action.has_outputs(date)
+    shutil.rmtree(options['output_dir'])
+
+
+def build_grib2_message(discipline, category, number):
+    section_1 = (21).to_bytes(4, 'big') + bytes([1]) + bytes(16)
+    section_4 = (34).to_bytes(4, 'big') + bytes([4]) + bytes(4) + \
+        bytes([category, number]) + bytes(23)
+    body = section_1 + section_4 + b'7777'
+    length = 16 + len(body)
+    return b'GRIB' + bytes(2) + bytes([discipline, 2]) + \
+        length.to_bytes(8, 'big') + body
+
+
+def test_download_gfs_batch_is_split_by_variable(options):
+    options['batch_variables'] = True
+    action = asv.DownloadGfsData('Download GFS data', options)
+    local_path = action._get_local_path(datetime(2022, 10, 1))
+    batch_path = local_path / 'batch.grib2'
+    hgt = build_grib2_message(0, 3, 5)
+    rh = build_grib2_message(0, 1, 1)
+    with open(batch_path, 'wb') as file:
+        file.write(hgt + rh + hgt)
+    file_paths = {'hgt': local_path / '2022100100.NWS_GFS.hgt.006.grib2',
+                  'rh': local_path / '2022100100.NWS_GFS.rh.006.grib2'}
+    assert action._split_grib_messages(batch_path, file_paths)
+    assert file_paths['hgt'].read_bytes() == hgt + hgt
+    assert file_paths['rh'].read_bytes() == rh
+    shutil.rmtree(options['output_dir'])
+
+
+def test_download_gfs_batch_fails_if_variable_missing(options):
+    options['batch_variables'] = True
+    action = asv.DownloadGfsData('Download GFS data', options)
+    local_path = action._get_local_path(datetime(2022, 10, 1))
+    batch_path = local_path / 'batch.grib2'
+    with open(batch_path, 'wb') as file:
+        file.write(build_grib2_message(0, 3, 5))
+    file_paths = {'hgt': local_path / '2022100100.NWS_GFS.hgt.006.grib2',
+                  'rh': local_path / '2022100100.NWS_GFS.rh.006.grib2'}
+    assert action._split_grib_messages(batch_path, file_paths) is False
+    assert count_files_recursively(options) == 1
+    shutil.rmtree(options['output_dir'])
+
+
+def test_download_gfs_batch_succeeds(options):
+    options['batch_variables'] = True
+    action = asv.DownloadGfsData('Download GFS data', options)
+    date = datetime.utcnow() - timedelta(days=1)
+    assert action.download(date)
+    assert count_files_recursively(options) == 3 * 4 * 2
+    shutil.rmtree(options['output_dir'])
+
+
+def mock_head(monkeypatch, status_code=None):
+    urls = []
+
+    def head(session, url, **kwargs):
+        urls.append(url)
+        if status_code is None:
+            raise requests.exceptions.ConnectionError("No connection")
+        response = requests.Response()
+        response.status_code = status_code
+        return response
+
+    monkeypatch.setattr(requests.Session, 'head', head)
+    return urls
+
+
+def test_download_gfs_is_available(options, monkeypatch):
+    action = asv.DownloadGfsData('Download GFS data', options)
+    date = datetime(2022, 10, 1)
+    urls = mock_head(monkeypatch, 200)
+    assert action.is_available(date)
+    assert urls == [action._build_index_url(date)]
+    mock_head(monkeypatch, 404)
+    assert action.is_available(date) is False
+    # Fails open if the probe cannot be performed
+    mock_head(monkeypatch)
+    assert action.is_available(date)
+    shutil.rmtree(options['output_dir'])
+
+
+def test_download_gfs_is_available_without_request_if_files_exist(options,
+                                                                  monkeypatch):
+    options['time_step_back'] = 1
+    action = asv.DownloadGfsData('Download GFS data', options)
+    date = datetime(2022, 10, 1)
+    local_path = action._get_local_path(date)
+    for lead_time in range(0, action.lead_time_max + 1, 6):
+        for variable in action.variables:
+            file_name = f'2022100100.NWS_GFS.{variable.lower()}.{lead_time:03d}.grib2'
+            (local_path / file_name).touch()
+    urls = mock_head(monkeypatch, 404)
+    assert action.is_available(date)
+    assert urls == []
+    shutil.rmtree(options['output_dir'])
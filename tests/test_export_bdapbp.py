@@ -5,6 +5,7 @@ import shutil
 import tempfile
 import types
 
+import numpy as np
 import pytest
 
 import atmoswing_vigicrues as asv
@@ -114,3 +115,116 @@ def test_export_bdapbp_with_all_stations(options, forecast_files, metadata):
             data = json.load(f)
             assert data['status'] == 0
     shutil.rmtree(options['output_dir'])
+
+
+def test_export_bdapbp_registers_artifacts(options, forecast_files, metadata):
+    artifacts = asv.ArtifactRegistry()
+    export = asv.ExportBdApBp('Export BdApBp', options)
+    export.feed(forecast_files, metadata, artifacts)
+    export.run()
+    files = artifacts.select('.json', 'Export BdApBp')
+    assert len(files) == 3
+    assert all(f.startswith(options['output_dir']) for f in files)
+    assert artifacts.select(tag='Other') == []
+    shutil.rmtree(options['output_dir'])
+
+
+def test_export_bdapbp_data_block_keeps_best_analogs(options, forecast_files):
+    forecast_files.sort()
+    nc_file = asv.ForecastFile(forecast_files[0])
+    options['only_relevant_stations'] = False
+    options['number_analogs'] = -1
+    export = asv.ExportBdApBp('Export BdApBp', options)
+    data_full, _ = export._create_data_and_statistics_blocks(nc_file)
+    options['number_analogs'] = 5
+    export = asv.ExportBdApBp('Export BdApBp', options)
+    data_best, statistics = export._create_data_and_statistics_blocks(nc_file)
+    nc_file.close()
+
+    assert list(data_best.keys()) == list(data_full.keys())
+    for station_id, targets in data_full.items():
+        for target_date, analogs in targets.items():
+            assert data_best[station_id][target_date] == analogs[0:5]
+            values = [analog[3] for analog in analogs]
+            assert values == sorted(values, reverse=True)
+            assert [analog[1] for analog in statistics[station_id][target_date]] \
+                   == values
+
+
+def test_export_bdapbp_uses_shared_forecast_files(options, forecast_files, metadata):
+    forecast_files = [asv.ForecastFile(file) for file in forecast_files]
+    export = asv.ExportBdApBp('Export BdApBp', options)
+    export.feed(forecast_files, metadata)
+    export.run()
+    assert count_files_recursively(options) == 3
+    for forecast_file in forecast_files:
+        # Left open for the next post-actions, with the variables in cache
+        assert forecast_file._dataset is not None
+        assert 'analog_values_rows' in forecast_file._cache
+        forecast_file.close()
+    shutil.rmtree(options['output_dir'])
+
+
+def create_reference_blocks(export, file_path):
+    # Per-station implementation of the blocks, prior to the batched version
+    nc_file = asv.Dataset(file_path, 'r', format='NETCDF4')
+    station_ids = nc_file['station_ids'][:]
+    target_dates = asv.utils.mjd_to_datetime(nc_file['target_dates'][:])
+    analog_dates = asv.utils.mjd_to_datetime(nc_file['analog_dates'][:])
+    analogs_nb = nc_file['analogs_nb'][:]
+    analog_criteria = nc_file['analog_criteria'][:]
+    analog_values = nc_file['analog_values_raw'][:]
+    nc_file.close()
+
+    time_format_analogs, time_format_target = export._get_time_format(target_dates)
+
+    data_block = {}
+    statistics_block = {}
+    for station_id in station_ids:
+        i_station = np.where(station_ids == station_id)
+        data_block[str(station_id)] = {}
+        statistics_block[str(station_id)] = {}
+        for i_target, target_date in enumerate(target_dates):
+            start = np.sum(analogs_nb[0:i_target])
+            n_analogs = analogs_nb[i_target]
+            end = start + n_analogs
+            values = analog_values[i_station, start:end].flatten()
+            permutation = (-values).argsort()
+            frequency = np.flip(asv.utils.build_cumulative_frequency(n_analogs))
+            n_kept = n_analogs
+            if 0 < export.number_analogs < n_analogs:
+                n_kept = export.number_analogs
+
+            target_date_str = target_date.item().strftime(time_format_target)
+            data_block[str(station_id)][target_date_str] = [
+                [round(frequency[i], 3),
+                 analog_dates[start:end][i_analog].item().strftime(
+                     time_format_analogs),
+                 round(float(analog_criteria[start:end][i_analog]), 2),
+                 round(float(values[i_analog]), 2)]
+                for i, i_analog in enumerate(permutation[0:n_kept])]
+            statistics_block[str(station_id)][target_date_str] = [
+                [round(frequency[i], 3), round(float(value), 2)]
+                for i, value in enumerate(np.sort(values)[::-1])]
+
+    return data_block, statistics_block
+
+
+def test_export_bdapbp_blocks_with_missing_values(options, forecast_files, tmp_path):
+    forecast_files.sort()
+    file_path = str(tmp_path / os.path.basename(forecast_files[0]))
+    shutil.copy(forecast_files[0], file_path)
+    nc_file = asv.Dataset(file_path, 'a')
+    nc_file['analog_values_raw'][0, 3] = np.nan
+    nc_file['analog_values_raw'][0, 10] = np.nan
+    nc_file.close()
+
+    options['only_relevant_stations'] = False
+    export = asv.ExportBdApBp('Export BdApBp', options)
+    forecast_file = asv.ForecastFile(file_path)
+    data, statistics = export._create_data_and_statistics_blocks(forecast_file)
+    forecast_file.close()
+    data_ref, statistics_ref = create_reference_blocks(export, file_path)
+
+    assert json.dumps(data) == json.dumps(data_ref)
+    assert json.dumps(statistics) == json.dumps(statistics_ref)
@@ -4,6 +4,7 @@ import shutil
 import tempfile
 import types
 
+import numpy as np
 import pytest
 
 import atmoswing_vigicrues as asv
@@ -70,3 +71,78 @@ def test_export_prv_runs_multi_time_steps(options):
     export.run()
     assert count_files_recursively(options) == 4
     shutil.rmtree(options['output_dir'])
+
+
+def test_export_prv_registers_artifacts(options, forecast_files, metadata):
+    options['combine_stations_in_one_file'] = False
+    artifacts = asv.ArtifactRegistry()
+    export = asv.ExportPrv('Export PRV', options)
+    export.feed(forecast_files, metadata, artifacts)
+    export.run()
+    assert len(artifacts.select('.csv', 'Export PRV')) == 21
+    assert artifacts.select('.json') == []
+    assert all(a.size > 0 for a in artifacts.artifacts)
+
+    # Files already present are registered again for the new run
+    artifacts.clear()
+    export.run()
+    assert len(artifacts.select('.csv')) == 21
+    shutil.rmtree(options['output_dir'])
+
+
+@pytest.mark.parametrize('n_analogs', [1, 2, 7, 30, 240])
+def test_export_prv_interpolation_matches_np_interp(n_analogs):
+    rng = np.random.default_rng(n_analogs)
+    xp = asv.utils.build_cumulative_frequency(n_analogs)
+    frequencies = np.concatenate([[0, 0.01, 0.1, 0.5, 0.95, 0.999, 1], xp])
+    values = rng.gamma(0.5, 10, (50, n_analogs)).astype(np.float32)
+    values[0:10, :] = np.round(values[0:10, :])
+    values[10, :] = 0
+    values[11, 0] = np.nan
+    values[12, -1] = np.inf
+    values = np.sort(values, axis=1).astype(float)
+
+    weights = asv.ExportPrv._get_interpolation_weights(n_analogs, frequencies)
+    result = asv.ExportPrv._interpolate(values, *weights)
+
+    for i_station in range(values.shape[0]):
+        expected = [np.interp(f, xp, values[i_station]) for f in frequencies]
+        np.testing.assert_array_equal(result[i_station], expected)
+
+
+def test_export_prv_writes_complete_files(options, forecast_files, metadata):
+    export = asv.ExportPrv('Export PRV', options)
+    export.feed(forecast_files, metadata)
+    export.run()
+    files = glob.glob(options['output_dir'] + '/**/*', recursive=True)
+    assert not [f for f in files if f.endswith('.part')]
+    for file in [f for f in files if f.endswith('.csv')]:
+        with open(file, newline='') as f:
+            lines = f.read().split('\r\n')
+        assert lines[-1] == ''
+        assert lines[7].startswith('Stations;')
+        n_values = len(lines[7].split(';'))
+        assert all(len(line.split(';')) == n_values for line in lines[10:-1])
+    shutil.rmtree(options['output_dir'])
+
+
+def test_export_prv_separate_files_in_parallel(options, forecast_files, metadata):
+    options['combine_stations_in_one_file'] = False
+    export = asv.ExportPrv('Export PRV', options)
+    export.feed(forecast_files, metadata)
+    export.run()
+    output_dir = options['output_dir']
+    files = sorted(glob.glob(output_dir + '/**/*.csv', recursive=True))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        options['output_dir'] = tmp_dir
+        options['max_workers'] = 4
+        export = asv.ExportPrv('Export PRV', options)
+        export.feed(forecast_files, metadata)
+        export.run()
+        files_parallel = sorted(glob.glob(tmp_dir + '/**/*.csv', recursive=True))
+        assert len(files_parallel) == len(files) == 21
+        for file, file_parallel in zip(files, files_parallel):
+            with open(file, 'rb') as f1, open(file_parallel, 'rb') as f2:
+                assert f1.read() == f2.read()
+    shutil.rmtree(output_dir)
@@ -0,0 +1,70 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+import atmoswing_vigicrues as asv
+
+DIR_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def forecast_file():
+    files = sorted(glob.glob(
+        DIR_PATH + "/files/atmoswing-forecasts-v2.1/2022/12/16/*.nc"))
+    forecast_file = asv.ForecastFile(files[0])
+    yield forecast_file
+    forecast_file.close()
+
+
+def test_forecast_file_is_opened_lazily(forecast_file):
+    assert forecast_file._dataset is None
+    assert os.fspath(forecast_file) == str(forecast_file.path)
+    assert forecast_file.method_id
+    assert forecast_file._dataset is not None
+
+
+def test_forecast_file_caches_variables(forecast_file):
+    values = forecast_file.analog_values_raw
+    assert forecast_file.analog_values_raw is values
+
+
+def test_forecast_file_is_released_when_closed(forecast_file):
+    values = forecast_file.analog_values_raw
+    forecast_file.close()
+    assert forecast_file._dataset is None
+    assert forecast_file._cache == {}
+    assert np.array_equal(forecast_file.analog_values_raw, values)
+
+
+def test_forecast_file_converts_variables(forecast_file):
+    nc_file = asv.Dataset(forecast_file.path, 'r', format='NETCDF4')
+    target_dates = asv.utils.mjd_to_datetime(nc_file['target_dates'][:])
+    assert np.array_equal(forecast_file.target_dates, target_dates)
+    analogs_nb = nc_file['analogs_nb'][:]
+    assert forecast_file.offsets[0] == 0
+    assert forecast_file.offsets[-1] == np.sum(analogs_nb)
+    assert len(forecast_file.offsets) == len(analogs_nb) + 1
+    assert len(forecast_file.analog_dates) == np.sum(analogs_nb)
+    assert forecast_file.relevant_station_ids == [
+        int(i) for i in nc_file.predictand_station_ids.split(",")]
+    nc_file.close()
+
+
+def test_forecast_file_reads_station_subsets(forecast_file):
+    nc_file = asv.Dataset(forecast_file.path, 'r', format='NETCDF4')
+    values = nc_file['analog_values_raw'][:]
+    nc_file.close()
+
+    rows = [5, 2, 5, 0]
+    subset = forecast_file.get_analog_values(rows)
+    assert 'analog_values_raw' not in forecast_file._cache
+    assert sorted(forecast_file._cache['analog_values_rows']) == [0, 2, 5]
+    assert np.array_equal(subset, values[rows, :])
+    assert np.array_equal(forecast_file.get_analog_values([2, 3]), values[[2, 3], :])
+    assert forecast_file.get_analog_values([]).shape == (0, values.shape[1])
+
+    all_rows = list(range(values.shape[0]))
+    assert np.array_equal(forecast_file.get_analog_values(all_rows), values)
+    assert 'analog_values_raw' in forecast_file._cache
@@ -0,0 +1,100 @@
+import glob
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from fakes import FakeDissemination
+
+import atmoswing_vigicrues as asv
+
+DIR_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def forecast_files():
+    return sorted(glob.glob(
+        DIR_PATH + "/files/atmoswing-forecasts-v2.1/2022/12/16/*.nc"))
+
+
+@pytest.fixture
+def outbox():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield asv.Outbox({'directory': tmp_dir + '/outbox'})
+
+
+def test_outbox_enqueue_copies_files(outbox, forecast_files):
+    action = FakeDissemination('Fake')
+    outbox.enqueue(action, datetime(2022, 12, 16), forecast_files)
+    items = outbox.pending()
+    assert len(items) == 1
+    assert items[0]['action'] == 'FakeDissemination:Fake'
+    assert items[0]['date'] == '2022-12-16 00'
+    assert [os.path.basename(f) for f in items[0]['files']] == \
+           [os.path.basename(f) for f in forecast_files]
+    assert all(os.path.isfile(f) for f in items[0]['files'])
+
+
+def test_outbox_enqueue_ignores_missing_files(outbox):
+    action = FakeDissemination('Fake')
+    outbox.enqueue(action, datetime(2022, 12, 16), ['/missing/file.nc'])
+    assert outbox.pending() == []
+    assert not os.path.exists(outbox.directory) or os.listdir(outbox.directory) == []
+
+
+def test_outbox_drain_sends_due_items(outbox, forecast_files):
+    action = FakeDissemination('Fake')
+    now = datetime(2022, 12, 16, 1)
+    outbox.enqueue(action, datetime(2022, 12, 16), forecast_files, now)
+    spool_dir = os.path.dirname(outbox.pending()[0]['files'][0])
+
+    # Not due yet
+    assert outbox.drain([action], now)
+    assert action.runs == []
+    assert len(outbox.pending()) == 1
+
+    assert outbox.drain([action], now + timedelta(minutes=5))
+    assert action.runs[0][0] == datetime(2022, 12, 16)
+    assert len(action.runs[0][1]) == len(forecast_files)
+    assert outbox.pending() == []
+    assert not os.path.exists(spool_dir)
+
+
+def test_outbox_drain_backs_off_exponentially(outbox, forecast_files):
+    action = FakeDissemination('Fake', failures=2)
+    now = datetime(2022, 12, 16, 1)
+    outbox.enqueue(action, datetime(2022, 12, 16), forecast_files, now)
+
+    now += timedelta(minutes=5)
+    assert not outbox.drain([action], now)
+    assert outbox.pending()[0]['attempts'] == 2
+    assert outbox.pending()[0]['next_attempt'] == '2022-12-16 01:15:00'
+
+    now += timedelta(minutes=10)
+    assert not outbox.drain([action], now)
+    assert outbox.pending()[0]['next_attempt'] == '2022-12-16 01:35:00'
+
+    now += timedelta(minutes=20)
+    assert outbox.drain([action], now)
+    assert len(action.runs) == 3
+    assert outbox.pending() == []
+
+
+def test_outbox_drain_gives_up_after_max_attempts(outbox, forecast_files):
+    outbox.max_attempts = 2
+    action = FakeDissemination('Fake', failures=5)
+    now = datetime(2022, 12, 16, 1)
+    outbox.enqueue(action, datetime(2022, 12, 16), forecast_files, now)
+    outbox.drain([action], now + timedelta(days=1))
+    outbox.drain([action], now + timedelta(days=2))
+    assert len(action.runs) == 2
+    assert outbox.pending() == []
+
+
+def test_outbox_keeps_items_of_unknown_actions(outbox, forecast_files):
+    action = FakeDissemination('Fake')
+    outbox.enqueue(action, datetime(2022, 12, 16), forecast_files)
+    other = FakeDissemination('Other')
+    assert outbox.drain([other], datetime.utcnow() + timedelta(days=1))
+    assert other.runs == []
+    assert len(outbox.pending()) == 1
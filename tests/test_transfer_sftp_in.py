@@ -1,9 +1,12 @@
+import contextlib
+import io
 import os
 import shutil
 import tempfile
 import types
 from datetime import datetime
 
+import paramiko
 import pytest
 
 import atmoswing_vigicrues as asv
@@ -85,12 +88,59 @@ def test_do_not_download_if_exists(options_with_variables, capsys):
     if RUN_SFTP:
         assert action.run(date)
         assert count_files_recursively(options_with_variables) == 4
+        capsys.readouterr()
         assert action.run(date)
         captured = capsys.readouterr()
-        assert captured.out == "  -> Fichiers déjà présents localement.\n"
+        assert "Nombre de fichiers récupérés : 0." in captured.out
         shutil.rmtree(options_with_variables['local_dir'])
 
 
+class FakeSftpListing:
+    def __init__(self, files):
+        self.files = files
+        self.downloads = []
+
+    def chdir(self, path):
+        pass
+
+    def listdir_attr(self, path='.'):
+        attributes = []
+        for name, content in self.files.items():
+            attribute = paramiko.SFTPAttributes()
+            attribute.filename = name
+            attribute.st_size = len(content)
+            attributes.append(attribute)
+        return attributes
+
+    def open(self, filename, mode='r', bufsize=-1):
+        self.downloads.append(filename)
+        return FakeSftpFile(self.files[filename], [])
+
+
+def test_incomplete_local_files_are_downloaded_again(options_with_variables,
+                                                     monkeypatch):
+    sftp = FakeSftpListing({'cep_r_202304131200.grb': b'1234',
+                            'cep_tcwv_202304131200.grb': b'5678'})
+
+    @contextlib.contextmanager
+    def connect(*args):
+        yield asv.SftpConnection(None, None, sftp)
+
+    monkeypatch.setattr(asv.sftp_pool, 'connect', connect)
+    action = asv.TransferSftpIn('Get CEP data over SFTP', options_with_variables)
+    date = datetime(2023, 4, 13, 12)
+    local_path = action._get_local_path(date)
+    with open(local_path / 'cep_r_202304131200.grb', 'wb') as file:
+        file.write(b'1234')
+    with open(local_path / 'cep_tcwv_202304131200.grb', 'wb') as file:
+        file.write(b'56')
+    assert action.run(date)
+    assert sftp.downloads == ['cep_tcwv_202304131200.grb']
+    with open(local_path / 'cep_tcwv_202304131200.grb', 'rb') as file:
+        assert file.read() == b'5678'
+    shutil.rmtree(options_with_variables['local_dir'])
+
+
 def test_download_arpege_succeeds(options_arpege):
     action = asv.TransferSftpIn('Get ARPEGE data over SFTP', options_arpege)
     date = datetime(2023, 4, 17, 00)
@@ -98,3 +148,139 @@ def test_download_arpege_succeeds(options_arpege):
         assert action.run(date)
         assert count_files_recursively(options_arpege) == 3
         shutil.rmtree(options_arpege['local_dir'])
+
+
+def test_download_cep_parallel_channels_succeeds(options_no_variables):
+    options_no_variables['max_channels'] = 3
+    action = asv.TransferSftpIn('Get CEP data over SFTP', options_no_variables)
+    date = datetime(2023, 4, 13, 12)
+    if RUN_SFTP:
+        assert action.run(date)
+        assert count_files_recursively(options_no_variables) == 6
+        shutil.rmtree(options_no_variables['local_dir'])
+
+
+def test_only_complete_local_files_are_skipped(options_with_variables):
+    action = asv.TransferSftpIn('Get CEP data over SFTP', options_with_variables)
+    local_path = action._get_local_path(datetime(2023, 4, 13, 12))
+    remote_files = []
+    for name in ['CEP_R_202304131200.grb', 'CEP_TCWV_202304131200.grb',
+                 'CEP_Z_202304131200.grb', 'CEP_R_202304130000.grb']:
+        attributes = paramiko.SFTPAttributes()
+        attributes.filename = name
+        attributes.st_size = 4
+        remote_files.append(attributes)
+    with open(local_path / 'CEP_R_202304131200.grb', 'wb') as file:
+        file.write(b'1234')
+    with open(local_path / 'CEP_TCWV_202304131200.grb', 'wb') as file:
+        file.write(b'12')
+    files_to_get = []
+    action._get_remote_files = lambda sftp, files, path: files_to_get.extend(files)
+    f_existing, f_new = action._get_files(None, remote_files, '2023041312', local_path)
+    assert f_existing == 1
+    assert f_new == 1
+    assert files_to_get[0].filename == 'CEP_TCWV_202304131200.grb'
+    shutil.rmtree(options_with_variables['local_dir'])
+
+
+def test_has_outputs(options_no_variables):
+    action = asv.TransferSftpIn('Get CEP data over SFTP', options_no_variables)
+    date = datetime(2023, 4, 13, 12)
+    local_path = action._get_local_path(date)
+    assert not action.has_outputs(date)
+    (local_path / 'CEP_R_202304131200.grb.part').touch()
+    assert not action.has_outputs(date)
+    (local_path / 'CEP_R_202304131200.grb').touch()
+    assert action.has_outputs(date)
+    shutil.rmtree(options_no_variables['local_dir'])
+
+
+def test_download_resumes_partial_file(options_arpege):
+    action = asv.TransferSftpIn('Get ARPEGE data over SFTP', options_arpege)
+    date = datetime(2023, 4, 17, 00)
+    archive = DIR_PATH + '/files/sftp-fake-files/ARPEGE_202304170000.tbz'
+    with open(archive, 'rb') as file:
+        content = file.read()
+    local_path = action._get_local_path(date)
+    with open(local_path / 'ARPEGE_202304170000.tbz.part', 'wb') as file:
+        file.write(content[0:100])
+    if RUN_SFTP:
+        assert action.run(date)
+        assert count_files_recursively(options_arpege) == 3
+        with open(local_path / 'ARPEGE_202304170000.tbz', 'rb') as file:
+            assert file.read() == content
+    shutil.rmtree(options_arpege['local_dir'])
+
+
+class FakeSftpFile(io.BytesIO):
+    def __init__(self, content, reads):
+        super().__init__(content)
+        self.reads = reads
+
+    def seek(self, offset, whence=0):
+        self.reads.append(offset)
+        return super().seek(offset, whence)
+
+    def prefetch(self, file_size=None):
+        pass
+
+
+class FakeSftpArchive:
+    def __init__(self, content):
+        self.content = content
+        self.reads = []
+
+    def open(self, filename, mode='r', bufsize=-1):
+        return FakeSftpFile(self.content, self.reads)
+
+
+@pytest.mark.parametrize('keep_archive', [True, False])
+def test_stream_unpack_resumes_partial_file(options_arpege, keep_archive):
+    options_arpege['stream_unpack'] = True
+    options_arpege['keep_archive'] = keep_archive
+    action = asv.TransferSftpIn('Get ARPEGE data over SFTP', options_arpege)
+    archive = DIR_PATH + '/files/sftp-fake-files/ARPEGE_202304170000.tbz'
+    with open(archive, 'rb') as file:
+        content = file.read()
+    local_path = action._get_local_path(datetime(2023, 4, 17, 00))
+    with open(local_path / 'ARPEGE_202304170000.tbz.part', 'wb') as file:
+        file.write(content[0:100])
+    remote_file = paramiko.SFTPAttributes()
+    remote_file.filename = 'ARPEGE_202304170000.tbz'
+    remote_file.st_size = len(content)
+
+    sftp = FakeSftpArchive(content)
+    action._get_remote_file(sftp, remote_file, local_path)
+    assert sftp.reads == [100]
+    assert not (local_path / 'ARPEGE_202304170000.tbz.part').exists()
+    assert (local_path / 'ARPEGE_202304170000.tbz').exists() == keep_archive
+    assert action._already_unpacked(remote_file, local_path) != keep_archive
+    assert count_files_recursively(options_arpege) == 3
+    shutil.rmtree(options_arpege['local_dir'])
+
+
+def test_download_arpege_stream_unpack_succeeds(options_arpege):
+    options_arpege['stream_unpack'] = True
+    action = asv.TransferSftpIn('Get ARPEGE data over SFTP', options_arpege)
+    date = datetime(2023, 4, 17, 00)
+    if RUN_SFTP:
+        assert action.run(date)
+        assert count_files_recursively(options_arpege) == 3
+        shutil.rmtree(options_arpege['local_dir'])
+
+
+def test_download_arpege_stream_unpack_without_archive(options_arpege, capsys):
+    options_arpege['stream_unpack'] = True
+    options_arpege['keep_archive'] = False
+    action = asv.TransferSftpIn('Get ARPEGE data over SFTP', options_arpege)
+    date = datetime(2023, 4, 17, 00)
+    if RUN_SFTP:
+        assert action.run(date)
+        local_path = action._get_local_path(date)
+        assert not (local_path / 'ARPEGE_202304170000.tbz').exists()
+        assert count_files_recursively(options_arpege) == 3
+        capsys.readouterr()
+        assert action.run(date)
+        captured = capsys.readouterr()
+        assert "Nombre de fichiers récupérés : 0." in captured.out
+        shutil.rmtree(options_arpege['local_dir'])
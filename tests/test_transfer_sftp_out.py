@@ -1,6 +1,13 @@
+import contextlib
 import glob
+import io
+import json
 import os
+import shutil
+import tarfile
+import tempfile
 import types
+import zipfile
 from datetime import datetime
 
 import pytest
@@ -37,3 +44,201 @@ def test_upload_nc_succeeds(options, forecast_files):
     date = datetime(2022, 12, 16, 00)
     if RUN_SFTP:
         assert action.run(date)
+
+
+class FakeSftp:
+    def __init__(self, failing_file):
+        self.failing_file = failing_file
+        self.files = []
+
+    def put(self, file, filename, confirm=True):
+        if filename == self.failing_file:
+            raise OSError("Failure")
+        self.files.append(filename)
+
+
+def test_upload_reports_failures_per_file(options, forecast_files):
+    forecast_files = sorted(forecast_files)
+    action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+    sftp = FakeSftp(os.path.basename(forecast_files[1]))
+    results = asv.connections.map_sftp_channels(
+        sftp, action._put_file, forecast_files + ['/missing/file.nc'], 1)
+    assert results == [True, False, True, True, False]
+    assert len(sftp.files) == 3
+
+
+def test_upload_nc_parallel_channels_succeeds(options, forecast_files):
+    options['max_channels'] = 3
+    options['confirm'] = False
+    action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+    action.feed(forecast_files)
+    date = datetime(2022, 12, 16, 00)
+    if RUN_SFTP:
+        assert action.run(date)
+
+
+def test_delta_sync_manifest_skips_unchanged_files(options, forecast_files):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file in forecast_files:
+            shutil.copy(file, tmp_dir)
+        files = sorted(glob.glob(tmp_dir + '/*.nc'))
+        options['delta_sync'] = 'manifest'
+        options['manifest_file'] = tmp_dir + '/manifest.json'
+        action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+        date = datetime(2022, 12, 16, 00)
+        action._update_manifest(action._load_manifest(), files[0:3], date)
+
+        # Same content with a new modification time
+        os.utime(files[1], (0, 0))
+        with open(files[2], 'ab') as file:
+            file.write(b'0')
+
+        manifest = action._load_manifest()
+        to_send, skipped = action._filter_with_manifest(manifest, files, date)
+        assert skipped == files[0:2]
+        assert to_send == files[2:]
+
+
+def test_delta_sync_stat_skips_unchanged_files(options, forecast_files, capsys):
+    options['delta_sync'] = 'stat'
+    action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+    action.feed(forecast_files)
+    date = datetime(2022, 12, 16, 00)
+    if RUN_SFTP:
+        assert action.run(date)
+        capsys.readouterr()
+        assert action.run(date)
+        captured = capsys.readouterr()
+        assert "Fichiers inchangés non transférés : 4" in captured.out
+
+
+class FakeSftpDirs:
+    def __init__(self, existing):
+        self.existing = set(existing)
+        self.calls = []
+
+    def stat(self, path):
+        self.calls.append(('stat', path))
+        if path not in self.existing:
+            raise IOError()
+
+    def mkdir(self, path):
+        self.calls.append(('mkdir', path))
+        if path in self.existing:
+            raise IOError()
+        self.existing.add(path)
+
+    def chdir(self, path):
+        self.calls.append(('chdir', path))
+
+
+def test_remote_dirs_are_created_once(options):
+    action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+    sftp = FakeSftpDirs(['some', 'some/dir'])
+    connection = asv.SftpConnection(None, None, sftp)
+    remote_path = action._get_remote_path(datetime(2022, 12, 16))
+    assert remote_path == 'some/dir/2022/12/16'
+    action._chdir_or_makedirs(connection, remote_path)
+    assert 'some/dir/2022/12/16' in sftp.existing
+    sftp.calls = []
+    action._chdir_or_makedirs(connection, remote_path)
+    assert sftp.calls == [('chdir', 'some/dir/2022/12/16')]
+    sftp.calls = []
+    action._chdir_or_makedirs(connection, action._get_remote_path(
+        datetime(2022, 12, 17)))
+    assert sftp.calls == [('stat', 'some/dir/2022/12/17'),
+                          ('mkdir', 'some/dir/2022/12/17'),
+                          ('chdir', 'some/dir/2022/12/17')]
+
+
+class FakeSftpBundle:
+    def __init__(self):
+        self.files = {}
+
+    def putfo(self, fl, remotepath, file_size=0, confirm=True):
+        self.files[remotepath] = fl.read()
+
+
+@pytest.mark.parametrize('bundle', ['tar.gz', 'zip'])
+def test_bundle_contains_all_files(options, forecast_files, bundle):
+    options['bundle'] = bundle
+    options['bundle_manifest'] = True
+    action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+    sftp = FakeSftpBundle()
+    assert action._put_bundle(sftp, forecast_files, datetime(2022, 12, 16))
+    bundle_name = f'2022-12-16_00.nc.{bundle}'
+    assert sorted(sftp.files) == [bundle_name, bundle_name + '.manifest.json']
+
+    content = io.BytesIO(sftp.files[bundle_name])
+    if bundle == 'zip':
+        names = zipfile.ZipFile(content).namelist()
+    else:
+        names = tarfile.open(fileobj=content, mode='r:gz').getnames()
+    assert sorted(names) == sorted(os.path.basename(f) for f in forecast_files)
+
+    manifest = json.loads(sftp.files[bundle_name + '.manifest.json'])
+    assert manifest['bundle'] == bundle_name
+    assert len(manifest['files']) == len(forecast_files)
+
+
+def test_bundle_incompatible_with_stat_delta_sync(options):
+    options['bundle'] = 'tar.gz'
+    options['delta_sync'] = 'stat'
+    with pytest.raises(ValueError):
+        asv.TransferSftpOut('Upload nc files over SFTP', options)
+
+
+def test_upload_nc_bundle_succeeds(options, forecast_files):
+    options['bundle'] = 'tar.gz'
+    options['bundle_manifest'] = True
+    action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+    action.feed(forecast_files)
+    date = datetime(2022, 12, 16, 00)
+    if RUN_SFTP:
+        assert action.run(date)
+
+
+class FakeSftpBundleDirs(FakeSftpBundle):
+    def stat(self, path):
+        pass
+
+    def chdir(self, path):
+        pass
+
+
+def test_bundle_with_manifest_contains_all_files(options, forecast_files,
+                                                 monkeypatch):
+    sftp = FakeSftpBundleDirs()
+
+    @contextlib.contextmanager
+    def connect(*args):
+        yield asv.SftpConnection(None, None, sftp)
+
+    monkeypatch.setattr(asv.sftp_pool, 'connect', connect)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file in forecast_files:
+            shutil.copy(file, tmp_dir)
+        files = sorted(glob.glob(tmp_dir + '/*.nc'))
+        options['bundle'] = 'tar.gz'
+        options['delta_sync'] = 'manifest'
+        options['manifest_file'] = tmp_dir + '/manifest.json'
+        action = asv.TransferSftpOut('Upload nc files over SFTP', options)
+        action.feed(files)
+        date = datetime(2022, 12, 16, 00)
+        bundle_name = '2022-12-16_00.nc.tar.gz'
+        assert action.run(date)
+        assert bundle_name in sftp.files
+
+        # Nothing changed: no new archive
+        sftp.files = {}
+        assert action.run(date)
+        assert sftp.files == {}
+
+        # One file changed: the new archive still contains all the files
+        with open(files[2], 'ab') as file:
+            file.write(b'0')
+        assert action.run(date)
+        content = io.BytesIO(sftp.files[bundle_name])
+        names = tarfile.open(fileobj=content, mode='r:gz').getnames()
+        assert sorted(names) == [os.path.basename(f) for f in files]
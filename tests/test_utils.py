@@ -1,10 +1,16 @@
+import datetime
+import glob
+import os
 import tempfile
 from pathlib import Path
 
+import numpy as np
 import pytest
 
 import atmoswing_vigicrues as asv
 
+DIR_PATH = os.path.dirname(os.path.abspath(__file__))
+
 
 def test_check_file_exists_fails():
     with tempfile.TemporaryDirectory() as tmp_dir:
@@ -26,3 +32,79 @@ def test_build_cumulative_frequency():
     assert f[0] < 1/100
     assert f[99] < 1
     assert f[99] > 99/100
+
+
+def mjd_to_datetime_reference(mjd):
+    # Element-wise implementation used before the vectorized version
+    jd = mjd + 2400000.5 + 0.5
+    f, i = np.modf(jd)
+    i = i.astype(int)
+    a = np.trunc((i - 1867216.25) / 36524.25)
+    b = np.zeros(len(jd))
+    b[i > 2299160] = i[i > 2299160] + 1 + a[i > 2299160] - \
+        np.trunc(a[i > 2299160] / 4.)
+    b[i <= 2299160] = i[i <= 2299160]
+    c = b + 1524
+    d = np.trunc((c - 122.1) / 365.25)
+    e = np.trunc(365.25 * d)
+    g = np.trunc((c - e) / 30.6001)
+    day = c - e + f - np.trunc(30.6001 * g)
+    month = np.zeros(len(jd))
+    month[g < 13.5] = g[g < 13.5] - 1
+    month[g >= 13.5] = g[g >= 13.5] - 13
+    month = month.astype(int)
+    year = np.zeros(len(jd))
+    year[month > 2.5] = d[month > 2.5] - 4716
+    year[month <= 2.5] = d[month <= 2.5] - 4715
+    year = year.astype(int)
+
+    frac_days, day = np.modf(day)
+    day = day.astype(int)
+    hour, minute = asv.utils.days_to_hours_mins(frac_days)
+
+    date = np.empty(len(mjd), dtype='datetime64[s]')
+    for idx, _ in enumerate(year):
+        date[idx] = datetime.datetime(year[idx], month[idx], day[idx],
+                                      hour[idx], minute[idx], 0, 0)
+    return date
+
+
+def test_jd_to_date():
+    year, month, day = asv.utils.jd_to_date(np.array([2460096.5, 2299159.5]))
+    assert year.tolist() == [2023, 1582]
+    assert month.tolist() == [6, 10]
+    assert day.tolist() == [1, 4]
+
+
+def test_jd_to_date_returns_scalars_for_scalar_input():
+    date = asv.utils.jd_to_date(2460096.5)
+    assert date == (2023, 6, 1.0)
+    assert [type(x) for x in date] == [int, int, float]
+    assert asv.utils.mjd_to_datetime(59215.5) == np.datetime64('2021-01-01T12:00:00')
+
+
+def test_mjd_to_datetime():
+    dates = asv.utils.mjd_to_datetime(np.array([59215.5, 59216.75, 40587.0]))
+    assert dates.dtype == np.dtype('datetime64[s]')
+    assert dates.tolist() == [datetime.datetime(2021, 1, 1, 12),
+                              datetime.datetime(2021, 1, 2, 18),
+                              datetime.datetime(1970, 1, 1)]
+
+
+def test_mjd_to_datetime_matches_reference():
+    mjd = np.concatenate([np.arange(-100000, 100000, 0.75),
+                          np.random.default_rng(42).uniform(-50000, 80000, 10000)])
+    assert np.array_equal(asv.utils.mjd_to_datetime(mjd),
+                          mjd_to_datetime_reference(mjd))
+
+
+def test_mjd_to_datetime_matches_reference_on_forecasts():
+    files = glob.glob(DIR_PATH + "/files/atmoswing-forecasts-v2.1/*/*/*/*.nc")
+    assert len(files) > 0
+    for file in files:
+        nc_file = asv.Dataset(file, 'r', format='NETCDF4')
+        for var in ['target_dates', 'analog_dates']:
+            mjd = nc_file[var][:]
+            assert np.array_equal(asv.utils.mjd_to_datetime(mjd),
+                                  mjd_to_datetime_reference(mjd))
+        nc_file.close()